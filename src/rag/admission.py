@@ -0,0 +1,194 @@
+"""
+Admission control for the LLM stage.
+
+At most max_concurrency completions run against llama-server at once; further
+requests wait in a bounded queue. A request is rejected straight away when the
+queue is full (429) or when, given the current queue and the observed completion
+time, it cannot start before its deadline (503). Both carry a Retry-After hint.
+
+The deadline is request scoped and travels in a context variable, so it is seen by
+every LLM call made on behalf of the request, including those in worker tasks. The
+latency budget travels the same way: unlike the deadline it does not fail the
+request, it is the point at which the SQL stage gives up on the LLM and serves the
+best retrieved query instead.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from config import admission_config
+from metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT, LLM_ACTIVE
+
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(seconds: Optional[float]):
+    """Set the current request's deadline, in seconds from now."""
+    if seconds is None or seconds <= 0:
+        request_deadline.set(None)
+    else:
+        request_deadline.set(time.monotonic() + seconds)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, None without a deadline."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+latency_budget: ContextVar[Optional[float]] = ContextVar("latency_budget", default=None)
+
+
+def set_latency_budget(seconds: Optional[float]):
+    """Set the current request's latency budget, in seconds from now."""
+    if seconds is None or seconds <= 0:
+        latency_budget.set(None)
+    else:
+        latency_budget.set(time.monotonic() + seconds)
+
+
+def budget_remaining() -> Optional[float]:
+    """Seconds left of the current request's latency budget, None without a budget."""
+    budget = latency_budget.get()
+    if budget is None:
+        return None
+    return budget - time.monotonic()
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is not admitted to the LLM stage.
+    """
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Service overloaded ({reason}), retry after {self.retry_after}s")
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the current request's deadline expires while work is in flight.
+    """
+
+
+def call_timeout(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Bound a per-call timeout by the time left before the request's deadline.
+
+    Raises:
+        DeadlineExceeded: When the deadline has already passed.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue and deadline aware admission.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrency: Completions allowed to run at once.
+            max_queue: Requests allowed to wait for a free slot.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.active = 0
+        self.service_time: Optional[float] = None  # moving average of slot hold time
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def estimated_wait(self) -> float:
+        """Expected seconds until a newly queued request gets a slot."""
+        if not self._semaphore.locked() or self.service_time is None:
+            return 0.0
+        return (self.waiting + 1) * self.service_time / self.max_concurrency
+
+    def _reject(self, status_code: int, reason: str):
+        ADMISSION_REJECTED.labels(reason).inc()
+        raise Overloaded(status_code, reason, self.estimated_wait())
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one LLM slot for the duration of the block.
+
+        Raises:
+            DeadlineExceeded: When the deadline has already passed.
+            Overloaded: When the request cannot be admitted before its deadline.
+        """
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded before admission")
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._reject(429, "queue_full")
+            if remaining is not None and self.estimated_wait() > remaining:
+                self._reject(503, "deadline")
+
+        queued_at = time.monotonic()
+        self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.set(self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=remaining)
+        except asyncio.TimeoutError:
+            self._reject(503, "deadline")
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_DEPTH.set(self.waiting)
+
+        started_at = time.monotonic()
+        ADMISSION_WAIT.observe(started_at - queued_at)
+        self.active += 1
+        LLM_ACTIVE.set(self.active)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            LLM_ACTIVE.set(self.active)
+            self._semaphore.release()
+            elapsed = time.monotonic() - started_at
+            self.service_time = (
+                elapsed
+                if self.service_time is None
+                else 0.8 * self.service_time + 0.2 * elapsed
+            )
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "estimated_wait": self.estimated_wait(),
+        }
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Return the process wide AdmissionController, creating it on first use."""
+    global _admission_controller
+    if _admission_controller is None:
+        config = admission_config()
+        _admission_controller = AdmissionController(
+            config.max_concurrency, config.max_queue
+        )
+    return _admission_controller
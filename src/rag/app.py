@@ -1,20 +1,160 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
 
 from pydantic import BaseModel
-from typing import Optional
-from llm import get_sql_query, recognise_intent, get_other_query
-from get_context import chroma_client
+from typing import List, Optional
+from llm import (
+    get_sql_query,
+    recognise_intent,
+    recognise_intent_with_retrieval,
+    route_intent,
+    get_other_query,
+    get_routed_answer,
+    explain_sql,
+    stream_sql_query,
+    stream_other_query,
+)
+from get_context import (
+    chroma_client,
+    warm_up,
+    embed_query,
+    embed_queries,
+    retreieve_results,
+    retreieve_results_batch,
+)
+from llm_client import close_llm_client, get_llm_client
+from llm_timings import capture_calls, llm_timings, summarize_calls
+from metrics import (
+    CACHE_REQUESTS,
+    ERRORS,
+    FALLBACKS,
+    IN_FLIGHT,
+    INTENTS,
+    REQUESTS_CANCELLED,
+    SHORT_CIRCUIT,
+    render_metrics,
+)
+from config import pipeline_config, cache_config, admission_config, query_log_config
+from admission import (
+    DeadlineExceeded,
+    Overloaded,
+    budget_remaining,
+    get_admission_controller,
+    remaining_time,
+    set_deadline,
+    set_latency_budget,
+)
+from intent_router import CentroidIntentRouter
+from semantic_cache import SemanticCache
+from disk_cache import DiskCache
+from prompts import get_tokenizer, prompt_version
+from prompts import config as prompt_settings
+from query_log import QueryLog, annotate, merge_entry, start_entry
+from singleflight import SingleFlight, retrieve_exception
+from pathlib import Path
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
+import json
+import time
+
+pipeline = pipeline_config()
+cache_settings = cache_config()
+admission_settings = admission_config()
+query_log_settings = query_log_config()
+
+coalescer = SingleFlight()
+
+# Populated by the lifespan hook, once per worker
+vector_store = None
+intent_router = None
+semantic_cache = None
+generation_cache = None
+query_log = None
+ready = False
+
+
+def load_intent_router():
+    if not Path(pipeline.intent_router_path).exists():
+        return None
+    return CentroidIntentRouter.load(
+        pipeline.intent_router_path, threshold=pipeline.intent_router_threshold
+    )
+
+
+def load_semantic_cache():
+    if not cache_settings.enabled:
+        return None
+    cache = SemanticCache(
+        threshold=cache_settings.similarity_threshold,
+        max_entries=cache_settings.max_entries,
+        ttl_seconds=cache_settings.ttl_seconds,
+        max_bytes=cache_settings.max_bytes,
+        persist_path=cache_settings.persist_path or None,
+    )
+    cache.load()
+    return cache
+
+
+def load_generation_cache():
+    if not cache_settings.disk_cache_path:
+        return None
+    return DiskCache(
+        cache_settings.disk_cache_path, max_bytes=cache_settings.disk_cache_max_bytes
+    )
+
+
+def load_query_log():
+    if not query_log_settings.path:
+        return None
+    return QueryLog(
+        query_log_settings.path,
+        max_bytes=query_log_settings.max_bytes,
+        backups=query_log_settings.backups,
+        flush_interval=query_log_settings.flush_interval,
+        max_buffer=query_log_settings.max_buffer,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global vector_store, intent_router, semantic_cache, generation_cache, query_log, ready
+
+    # Load the embedding model and open the vector store once, then warm them up
+    vector_store = await asyncio.to_thread(chroma_client)
+    intent_router = await asyncio.to_thread(load_intent_router)
+    semantic_cache = await asyncio.to_thread(load_semantic_cache)
+    generation_cache = await asyncio.to_thread(load_generation_cache)
+    await asyncio.to_thread(warm_up, vector_store, pipeline.warmup_rounds)
+    if prompt_settings.compact_context:
+        # The context token budget is counted with the Llama tokenizer, load it off the loop
+        await asyncio.to_thread(get_tokenizer)
+    get_llm_client().pool.start_health_checks()
+    query_log = load_query_log()
+    if query_log is not None:
+        query_log.start()
+    ready = True
+    try:
+        yield
+    finally:
+        ready = False
+        await close_llm_client()
+        if semantic_cache is not None:
+            semantic_cache.save()
+        if generation_cache is not None:
+            generation_cache.close()
+        if query_log is not None:
+            await query_log.aclose()
 
-vector_store = chroma_client()
 
 # Create FastAPI app
 app = FastAPI(
     title="SQL Generation API",
     description="API for generating SQL queries from natural language questions",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -33,6 +173,18 @@ app.add_middleware(
 class SQLGenerationRequest(BaseModel):
     question: str
     # schema: Optional[str] = None  # Optional schema override
+    short_circuit_threshold: Optional[float] = None  # overrides pipeline_config, 0 disables
+    deadline_ms: Optional[int] = None  # overrides admission_config.default_deadline
+    latency_budget_ms: Optional[int] = None  # overrides pipeline_config.fallback_budget, 0 disables
+    debug: bool = False  # add the token usage and timings of every LLM call to the response
+
+
+class SQLBatchRequest(BaseModel):
+    questions: List[str]
+    max_concurrency: Optional[int] = None  # defaults to pipeline_config.batch_max_concurrency
+    short_circuit_threshold: Optional[float] = None
+    deadline_ms: Optional[int] = None  # deadline for the whole batch, none by default
+    latency_budget_ms: Optional[int] = None  # per question, from when it starts
 
 
 # Define response model
@@ -40,6 +192,238 @@ class SQLGenerationResponse(BaseModel):
     question: str
     sql_query: str
     model_used: str
+    fallback: bool = False  # the LLM missed the latency budget, sql_query is the best retrieved one
+    debug: Optional[dict] = None  # per LLM call usage, only when the request set debug
+
+
+class ExplainSQLRequest(BaseModel):
+    sql_query: str
+    question: Optional[str] = None  # question the query answers, improves the explanation
+    deadline_ms: Optional[int] = None
+
+
+class ExplainSQLResponse(BaseModel):
+    sql_query: str
+    explanation: str
+    model_used: str
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_handler(request: Request, exc: DeadlineExceeded):
+    REQUESTS_CANCELLED.labels("deadline").inc()
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+async def run_cancellable(request: Request, coro):
+    """
+    Run coro until it finishes, the client disconnects or the deadline expires.
+
+    In the last two cases the task is cancelled, which aborts any upstream
+    llama-server call it is waiting on.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            poll = admission_settings.disconnect_poll_interval
+            remaining = remaining_time()
+            if remaining is not None:
+                poll = max(0, min(poll, remaining))
+            done, _ = await asyncio.wait({task}, timeout=poll)
+            if task in done:
+                return task.result()
+            if await request.is_disconnected():
+                REQUESTS_CANCELLED.labels("disconnect").inc()
+                # 499: client closed request, nobody is listening anymore
+                return Response(status_code=499)
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded("Request deadline exceeded")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def request_deadline_seconds(deadline_ms: Optional[int], default: Optional[float]):
+    if deadline_ms is not None:
+        return deadline_ms / 1000
+    return default
+
+
+class RequestTracking:
+    """
+    In-flight and error accounting for the /generate-sql endpoints.
+
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware wraps the
+    receive channel, so request.is_disconnected() never reports a client that went
+    away and run_cancellable could not cancel its work.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/generate-sql"):
+            return await self.app(scope, receive, send)
+
+        endpoint = scope["path"]
+        status = None
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with IN_FLIGHT.labels(endpoint).track_inprogress():
+            try:
+                await self.app(scope, receive, send_with_status)
+            except Exception:
+                ERRORS.labels(endpoint).inc()
+                raise
+        if status is not None and status >= 500:
+            ERRORS.labels(endpoint).inc()
+
+
+app.add_middleware(RequestTracking)
+
+
+async def classify(question: str, embedding: list = None):
+    """Return (intent, schema); schema is only set when retrieval already ran."""
+    if intent_router is not None:
+        return await route_intent(
+            question,
+            vector_store,
+            intent_router,
+            speculative=pipeline.speculative_retrieval,
+            embedding=embedding,
+        )
+    if pipeline.speculative_retrieval:
+        return await recognise_intent_with_retrieval(
+            question, vector_store, embedding=embedding
+        )
+    return await recognise_intent(question), None
+
+
+async def classify_intent(question: str, embedding: list = None):
+    """Intent only, for callers that already hold the retrieval result."""
+    if intent_router is not None and embedding is not None:
+        intent = intent_router.route(embedding)
+        if intent is not None:
+            INTENTS.labels(intent, "router").inc()
+            return intent
+    return await recognise_intent(question)
+
+
+def short_circuit(question: str, schema: list, threshold: float):
+    """
+    Return the stored SQL as a response when a retrieved question matches closely enough.
+    """
+    if not threshold or not schema:
+        return None
+    best = max(schema, key=lambda item: item.get("similarity", 0))
+    if best.get("similarity", 0) >= threshold and best.get("sql"):
+        SHORT_CIRCUIT.labels("hit").inc()
+        annotate(intent="specific", cache="short_circuit")
+        return SQLGenerationResponse(
+            question=question, sql_query=best["sql"], model_used="retrieval"
+        )
+    SHORT_CIRCUIT.labels("miss").inc()
+    return None
+
+
+def fallback_response(question: str, schema: list):
+    """The best retrieved SQL as a fallback response, None when nothing was retrieved."""
+    candidates = [item for item in schema or [] if item.get("sql")]
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda item: item.get("similarity", 0))
+    return SQLGenerationResponse(
+        question=question, sql_query=best["sql"], model_used="retrieval", fallback=True
+    )
+
+
+async def sql_within_budget(question: str, schema: list):
+    """
+    Run the SQL generation, abandoning it for the best retrieved SQL when the latency
+    budget runs out first or the LLM stage sheds the request.
+
+    Returns the completion, or a fallback SQLGenerationResponse. Without a budget or
+    anything retrieved to fall back on, the generation runs unbounded.
+    """
+    remaining = budget_remaining()
+    fallback = fallback_response(question, schema) if remaining is not None else None
+    if fallback is None:
+        return await get_sql_query(question, vector_store, schema=schema)
+
+    task = asyncio.ensure_future(get_sql_query(question, vector_store, schema=schema))
+    try:
+        done, _ = await asyncio.wait({task}, timeout=max(0, remaining))
+        if task in done:
+            return task.result()
+        # Cancelling aborts the upstream call and frees the llama-server slot
+        FALLBACKS.labels("budget").inc()
+        REQUESTS_CANCELLED.labels("budget").inc()
+    except Overloaded:
+        FALLBACKS.labels("overloaded").inc()
+    finally:
+        if not task.done():
+            task.cancel()
+    return fallback
+
+
+async def resolve(question: str, embedding: list = None, threshold: float = None):
+    """
+    Classify the question and fetch its context.
+
+    Returns (intent, schema, shortcut) where shortcut is a ready response when a
+    stored question matched at or above the short-circuit threshold.
+    """
+    if threshold is None:
+        threshold = pipeline.short_circuit_threshold
+    if not threshold:
+        intent, schema = await classify(question, embedding)
+        return intent, schema, None
+
+    if not pipeline.speculative_retrieval:
+        # Retrieval first: a near-exact match makes both LLM calls unnecessary
+        schema = await asyncio.to_thread(
+            retreieve_results, vector_store, question, embedding
+        )
+        shortcut = short_circuit(question, schema, threshold)
+        if shortcut is not None:
+            return "specific", schema, shortcut
+        intent = await classify_intent(question, embedding)
+        return intent, schema if intent == "specific" else None, None
+
+    if embedding is None and intent_router is not None:
+        # Embed once, for both the router and the retrieval
+        embedding = await asyncio.to_thread(embed_query, vector_store, question)
+    # Classify while retrieving, a near-exact match cancels the intent call
+    classification = asyncio.ensure_future(classify_intent(question, embedding))
+    # A classification dropped for the short-circuit may fail unobserved
+    classification.add_done_callback(retrieve_exception)
+    try:
+        schema = await asyncio.to_thread(
+            retreieve_results, vector_store, question, embedding
+        )
+    except BaseException:
+        classification.cancel()
+        raise
+    shortcut = short_circuit(question, schema, threshold)
+    if shortcut is not None:
+        classification.cancel()
+        return "specific", schema, shortcut
+    intent = await classification
+    return intent, schema if intent == "specific" else None, None
 
 
 @app.get("/")
@@ -49,33 +433,556 @@ async def root():
     }
 
 
-@app.post("/generate-sql", response_model=SQLGenerationResponse)
-async def generate_sql(request: SQLGenerationRequest):
+@app.get("/intent-router/stats")
+async def intent_router_stats():
+    if intent_router is None:
+        return {"enabled": False}
+    return {"enabled": True, **intent_router.stats()}
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    if not ready:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return get_llm_client().pool.stats()
+
+
+@app.get("/llm/timings")
+async def llm_timing_stats():
+    return llm_timings.stats()
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    return get_admission_controller().stats()
+
+
+@app.get("/query-log/stats")
+async def query_log_stats():
+    if query_log is None:
+        return {"enabled": False}
+    return {"enabled": True, **query_log.stats()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "semantic": (
+            {"enabled": True, **semantic_cache.stats()}
+            if semantic_cache is not None
+            else {"enabled": False}
+        ),
+        "generations": (
+            {"enabled": True, **(await asyncio.to_thread(generation_cache.stats))}
+            if generation_cache is not None
+            else {"enabled": False}
+        ),
+    }
+
+
+def cached_response(question: str, embedding: list):
+    if semantic_cache is None:
+        return None
+    cached = semantic_cache.get(embedding)
+    if cached is None:
+        CACHE_REQUESTS.labels("semantic", "miss").inc()
+        return None
+    CACHE_REQUESTS.labels("semantic", "hit").inc()
+    annotate(cache="semantic")
+    return SQLGenerationResponse(
+        question=question,
+        sql_query=cached["sql_query"],
+        model_used=cached["model_used"],
+    )
+
+
+def generation_key(question: str, stage: str, schema) -> str:
+    """Disk cache key: normalized question, retrieval context, model and prompt version."""
+    context = [
+        (item.get("schema", ""), item.get("question", ""), item.get("sql", ""))
+        for item in schema or []
+    ]
+    return DiskCache.make_key(
+        SemanticCache.normalize_question(question),
+        DiskCache.make_key(context),
+        get_llm_client().model,
+        prompt_version(stage),
+    )
+
+
+def remember(question: str, embedding, sql: str, model_name: str):
+    if semantic_cache is not None and embedding is not None:
+        semantic_cache.put(
+            question,
+            embedding,
+            {"sql_query": sql, "model_used": model_name},
+        )
+
+
+async def stored_answer(question: str, stage: str, schema, embedding):
+    """
+    Look the generation up in the disk cache.
+
+    Returns (disk_key, response), the response is None on a miss and both are None
+    when the disk cache is disabled.
+    """
+    if generation_cache is None:
+        return None, None
+    disk_key = generation_key(question, stage, schema)
+    stored = await asyncio.to_thread(generation_cache.get, disk_key)
+    if stored is None:
+        CACHE_REQUESTS.labels("disk", "miss").inc()
+        return disk_key, None
+    CACHE_REQUESTS.labels("disk", "hit").inc()
+    annotate(cache="disk")
+    remember(question, embedding, stored["sql_query"], stored["model_used"])
+    return disk_key, SQLGenerationResponse(question=question, **stored)
+
+
+async def generate_answer(question: str, intent: str, schema=None, embedding=None):
+    """Run the generation call for a classified question and cache the result."""
+    annotate(intent=intent)
+    specific = intent and intent == "specific"
+    disk_key = None
+    if generation_cache is not None:
+        if specific and schema is None:
+            schema = await asyncio.to_thread(
+                retreieve_results, vector_store, question, embedding
+            )
+        disk_key, stored = await stored_answer(
+            question, "sql" if specific else "general", schema, embedding
+        )
+        if stored is not None:
+            return stored
+
+    if specific:
+        if schema is None and budget_remaining() is not None:
+            # Retrieve up front, the result is what a slow generation falls back on
+            schema = await asyncio.to_thread(
+                retreieve_results, vector_store, question, embedding
+            )
+        response = await sql_within_budget(question, schema)
+        if isinstance(response, SQLGenerationResponse):
+            # Fallbacks are not cached, the next request should get a generation
+            return response
+    else:
+        response = await get_other_query(question)
+
+    # Extract SQL from response
+    if "choices" in response and len(response["choices"]) > 0:
+        sql = response["choices"][0]["message"]["content"]
+        # if not sql.endswith(";"):
+        #     sql += ";"
+        model_name = response.get("model", "Unknown")
+
+        remember(question, embedding, sql, model_name)
+        if disk_key is not None:
+            await asyncio.to_thread(
+                generation_cache.put,
+                disk_key,
+                {"sql_query": sql, "model_used": model_name},
+            )
+
+        return SQLGenerationResponse(
+            question=question, sql_query=sql, model_used=model_name
+        )
+    else:
+        raise HTTPException(status_code=500, detail="Failed to generate SQL query")
+
+
+async def generate_routed(question: str, schema=None, embedding=None):
+    """
+    Single-call strategy: one completion classifies the question and answers it.
+
+    A confident intent router still decides locally, and the answer then comes from
+    the regular per-intent prompt.
+    """
+    if intent_router is not None and embedding is not None:
+        intent = intent_router.route(embedding)
+        if intent is not None:
+            INTENTS.labels(intent, "router").inc()
+            return await generate_answer(question, intent, schema, embedding)
+
+    if schema is None:
+        schema = await asyncio.to_thread(
+            retreieve_results, vector_store, question, embedding
+        )
+    disk_key, stored = await stored_answer(question, "routed", schema, embedding)
+    if stored is not None:
+        return stored
+
+    intent, answer, response = await get_routed_answer(
+        question, vector_store, schema=schema
+    )
+    annotate(intent=intent)
+    model_name = response.get("model", "Unknown")
+    remember(question, embedding, answer, model_name)
+    if disk_key is not None:
+        await asyncio.to_thread(
+            generation_cache.put,
+            disk_key,
+            {"sql_query": answer, "model_used": model_name},
+        )
+    return SQLGenerationResponse(question=question, sql_query=answer, model_used=model_name)
+
+
+async def answer_routed(question: str, embedding=None, threshold: float = None):
+    """Retrieval, short-circuit check and a single routed completion."""
+    if threshold is None:
+        threshold = pipeline.short_circuit_threshold
+    schema = await asyncio.to_thread(retreieve_results, vector_store, question, embedding)
+    shortcut = short_circuit(question, schema, threshold)
+    if shortcut is not None:
+        return shortcut
+    return await generate_routed(question, schema, embedding)
+
+
+@app.post(
+    "/generate-sql", response_model=SQLGenerationResponse, response_model_exclude_none=True
+)
+async def generate_sql(request: SQLGenerationRequest, http_request: Request):
+    if query_log is None:
+        return await run_generate_sql(request, http_request)
+
+    start = time.perf_counter()
+    entry = start_entry(
+        question=request.question, request=request.model_dump(exclude_none=True)
+    )
+    status = 500
     try:
-        # Get SQL query using the LLM
-        intent = recognise_intent(request.question)
-        if intent and intent == "specific":
-            response = get_sql_query(request.question, vector_store)
-        else:
-            response = get_other_query(request.question)
-
-        # Extract SQL from response
-        if "choices" in response and len(response["choices"]) > 0:
-            sql = response["choices"][0]["message"]["content"]
-            # if not sql.endswith(";"):
-            #     sql += ";"
-            model_name = response.get("model", "Unknown")
-
-            return SQLGenerationResponse(
-                question=request.question, sql_query=sql, model_used=model_name
+        response = await run_generate_sql(request, http_request)
+        status = response.status_code if isinstance(response, Response) else 200
+        if isinstance(response, SQLGenerationResponse):
+            entry.update(model_used=response.model_used, fallback=response.fallback)
+        return response
+    except (HTTPException, Overloaded) as e:
+        status = e.status_code
+        raise
+    except DeadlineExceeded:
+        status = 504
+        raise
+    finally:
+        entry.update(status=status, total_ms=round((time.perf_counter() - start) * 1000, 3))
+        # Abandoned work may still time stages, log a snapshot
+        entry["stages"] = {stage: round(ms, 3) for stage, ms in list(entry["stages"].items())}
+        query_log.record(entry)
+
+
+async def run_generate_sql(request: SQLGenerationRequest, http_request: Request):
+    set_deadline(
+        request_deadline_seconds(request.deadline_ms, admission_settings.default_deadline)
+    )
+    set_latency_budget(
+        request_deadline_seconds(request.latency_budget_ms, pipeline.fallback_budget)
+    )
+    if not pipeline.coalesce_requests:
+        return await run_cancellable(http_request, answer_question(request))
+
+    key = json.dumps(
+        [
+            SemanticCache.normalize_question(request.question),
+            request.short_circuit_threshold,
+            request.latency_budget_ms,
+            request.debug,
+        ]
+    )
+    while True:
+        joined = coalescer.joins(key)
+        annotate(cache="coalesced" if joined else "miss")
+        try:
+            result = await run_cancellable(
+                http_request, coalescer.do(key, lambda: shared_answer(request))
+            )
+            break
+        except (DeadlineExceeded, Overloaded) as e:
+            # The shared call runs on its leader's deadline, a follower with time
+            # left over starts (or joins) a new one
+            remaining = remaining_time()
+            if (
+                not joined
+                or (isinstance(e, Overloaded) and e.reason != "deadline")
+                or (remaining is not None and remaining <= 0)
+            ):
+                raise
+    if isinstance(result, Response):
+        return result
+    response, shared_entry = result
+    merge_entry(shared_entry)
+    if isinstance(response, SQLGenerationResponse):
+        # Followers may differ from the leader in case or whitespace
+        response = response.model_copy(update={"question": request.question})
+    return response
+
+
+async def shared_answer(request: SQLGenerationRequest):
+    """
+    answer_question run as the coalesced task shared by every waiter on its key.
+
+    The task starts from the leader's context and keeps the leader's deadline, so
+    admission and call timeouts work as for a single request. The log entry is
+    reset: each waiter copies the shared work's log fields into its own entry.
+    Returns (response, entry).
+    """
+    entry = start_entry()
+    return await answer_question(request), entry
+
+
+async def answer_question(request: SQLGenerationRequest):
+    """Answer a question, with its LLM calls attached when the request asked for debug."""
+    if not request.debug:
+        return await resolve_question(request)
+    calls = capture_calls()
+    response = await resolve_question(request)
+    return response.model_copy(update={"debug": summarize_calls(calls)})
+
+
+async def resolve_question(request: SQLGenerationRequest):
+    """Cache lookup, classification and generation for a single question."""
+    try:
+        embedding = None
+        if semantic_cache is not None:
+            embedding = await asyncio.to_thread(
+                embed_query, vector_store, request.question
+            )
+            cached = cached_response(request.question, embedding)
+            if cached is not None:
+                return cached
+
+        if pipeline.strategy == "single_call":
+            return await answer_routed(
+                request.question, embedding, request.short_circuit_threshold
             )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to generate SQL query")
 
+        intent, schema, shortcut = await resolve(
+            request.question, embedding, request.short_circuit_threshold
+        )
+        if shortcut is not None:
+            return shortcut
+
+        # Get SQL query using the LLM
+        return await generate_answer(request.question, intent, schema, embedding)
+
+    except (Overloaded, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating SQL: {str(e)}")
 
 
+@app.post("/generate-sql/batch")
+async def generate_sql_batch(request: SQLBatchRequest):
+    questions = request.questions
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    set_deadline(request_deadline_seconds(request.deadline_ms, None))
+
+    try:
+        # One encode and one multi-query Chroma call for the whole batch
+        embeddings = await asyncio.to_thread(embed_queries, vector_store, questions)
+        schemas = await asyncio.to_thread(
+            retreieve_results_batch, vector_store, questions, embeddings
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving context: {str(e)}")
+
+    semaphore = asyncio.Semaphore(
+        request.max_concurrency or pipeline.batch_max_concurrency
+    )
+    threshold = (
+        request.short_circuit_threshold
+        if request.short_circuit_threshold is not None
+        else pipeline.short_circuit_threshold
+    )
+
+    async def answer(index: int):
+        question = questions[index]
+        # Each answer runs in its own task, so the budget is per question
+        set_latency_budget(
+            request_deadline_seconds(request.latency_budget_ms, pipeline.fallback_budget)
+        )
+        try:
+            cached = cached_response(question, embeddings[index])
+            if cached is not None:
+                return {"index": index, **cached.model_dump(exclude_none=True)}
+
+            shortcut = short_circuit(question, schemas[index], threshold)
+            if shortcut is not None:
+                return {"index": index, **shortcut.model_dump(exclude_none=True)}
+
+            async with semaphore:
+                if pipeline.strategy == "single_call":
+                    result = await generate_routed(
+                        question, schemas[index], embeddings[index]
+                    )
+                else:
+                    intent = await classify_intent(question, embeddings[index])
+                    result = await generate_answer(
+                        question, intent, schemas[index], embeddings[index]
+                    )
+            return {"index": index, **result.model_dump(exclude_none=True)}
+        except DeadlineExceeded as e:
+            REQUESTS_CANCELLED.labels("deadline").inc()
+            return {"index": index, "question": question, "error": str(e)}
+        except Overloaded as e:
+            return {
+                "index": index,
+                "question": question,
+                "error": str(e),
+                "retry_after": e.retry_after,
+            }
+        except Exception as e:
+            ERRORS.labels("/generate-sql/batch").inc()
+            return {"index": index, "question": question, "error": str(e)}
+
+    async def ndjson_lines():
+        tasks = [asyncio.ensure_future(answer(i)) for i in range(len(questions))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/explain-sql", response_model=ExplainSQLResponse)
+async def explain_sql_endpoint(request: ExplainSQLRequest, http_request: Request):
+    set_deadline(
+        request_deadline_seconds(request.deadline_ms, admission_settings.default_deadline)
+    )
+    return await run_cancellable(http_request, explain(request))
+
+
+async def explain(request: ExplainSQLRequest):
+    """Explain a generated query on demand, explanations are cached like generations."""
+    disk_key = None
+    if generation_cache is not None:
+        disk_key = DiskCache.make_key(
+            request.sql_query.strip(),
+            SemanticCache.normalize_question(request.question or ""),
+            get_llm_client().model,
+            prompt_version("explain"),
+        )
+        stored = await asyncio.to_thread(generation_cache.get, disk_key)
+        if stored is not None:
+            CACHE_REQUESTS.labels("disk", "hit").inc()
+            return ExplainSQLResponse(sql_query=request.sql_query, **stored)
+        CACHE_REQUESTS.labels("disk", "miss").inc()
+
+    try:
+        response = await explain_sql(request.sql_query, request.question)
+    except (Overloaded, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error explaining SQL: {str(e)}")
+
+    if not response.get("choices"):
+        raise HTTPException(status_code=500, detail="Failed to explain SQL query")
+    result = {
+        "explanation": response["choices"][0]["message"]["content"],
+        "model_used": response.get("model", "Unknown"),
+    }
+    if disk_key is not None:
+        await asyncio.to_thread(generation_cache.put, disk_key, result)
+    return ExplainSQLResponse(sql_query=request.sql_query, **result)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate-sql/stream")
+async def generate_sql_stream(request: SQLGenerationRequest):
+    deadline = request_deadline_seconds(
+        request.deadline_ms, admission_settings.default_deadline
+    )
+
+    async def event_stream():
+        set_deadline(deadline)
+        start = time.perf_counter()
+        first_token_ms = None
+        model_name = "Unknown"
+        try:
+            intent, schema, shortcut = await resolve(
+                request.question, threshold=request.short_circuit_threshold
+            )
+            if shortcut is not None:
+                yield sse_event("token", {"content": shortcut.sql_query})
+                yield sse_event(
+                    "done",
+                    {
+                        "question": request.question,
+                        "model_used": shortcut.model_used,
+                        "time_to_first_token_ms": (time.perf_counter() - start) * 1000,
+                        "total_ms": (time.perf_counter() - start) * 1000,
+                    },
+                )
+                return
+
+            if intent and intent == "specific":
+                chunks = stream_sql_query(request.question, vector_store, schema=schema)
+            else:
+                chunks = stream_other_query(request.question)
+
+            async for chunk in chunks:
+                model_name = chunk.get("model", model_name)
+                if not chunk.get("choices"):
+                    continue
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if not content:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                yield sse_event("token", {"content": content})
+
+            yield sse_event(
+                "done",
+                {
+                    "question": request.question,
+                    "model_used": model_name,
+                    "time_to_first_token_ms": first_token_ms,
+                    "total_ms": (time.perf_counter() - start) * 1000,
+                },
+            )
+        except DeadlineExceeded as e:
+            REQUESTS_CANCELLED.labels("deadline").inc()
+            yield sse_event("error", {"detail": str(e), "status_code": 504})
+        except Overloaded as e:
+            yield sse_event(
+                "error",
+                {
+                    "detail": str(e),
+                    "status_code": e.status_code,
+                    "retry_after": e.retry_after,
+                },
+            )
+        except Exception as e:
+            ERRORS.labels("/generate-sql/stream").inc()
+            yield sse_event("error", {"detail": f"Error generating SQL: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # For direct execution
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,120 @@
+"""
+Compare fixed-k and adaptive-k retrieval.
+
+For every data question ("specific") in the labelled CSV, retrieves question-SQL examples from the
+vector store with a fixed k and with the adaptive similarity-gap cutoff, and reports
+the examples kept, SQL prompt tokens and HNSW query latency for both. Fewer examples
+pay off in prompt evaluation, so each question is then sent through get_sql_query
+with both selections against the configured llama-server, one at a time, and the
+prompt eval time (timings.prompt_ms), prompt tokens evaluated and total generation
+latency are reported per selection. --generate False skips the LLM run.
+
+    python src/rag/bench_retrieval.py --csv_path data/rag/intent_labels.csv
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import fire
+import pandas as pd
+
+from bench_utils import summarize
+from config import retrieval_config
+from get_context import chroma_client, select_adaptive
+from llm import get_sql_query
+from llm_client import close_llm_client
+from prompts import count_tokens, sql_query_request
+
+
+def prompt_tokens(question, items):
+    return count_tokens(sql_query_request(question, items)["messages"][1]["content"])
+
+
+async def run_generation(questions, selections, vector_store, rounds):
+    report = {
+        name: {"prompt_ms": [], "prompt_tokens_evaluated": [], "total_ms": []}
+        for name in selections
+    }
+    for _ in range(rounds):
+        for index, question in enumerate(questions):
+            for name, items in selections.items():
+                start = time.perf_counter()
+                response = await get_sql_query(question, vector_store, schema=items[index])
+                report[name]["total_ms"].append((time.perf_counter() - start) * 1000)
+                timings = response.get("timings") or {}
+                if timings.get("prompt_ms") is not None:
+                    report[name]["prompt_ms"].append(timings["prompt_ms"])
+                    report[name]["prompt_tokens_evaluated"].append(timings.get("prompt_n", 0))
+    await close_llm_client()
+    return {
+        name: {metric: summarize(values) if values else None for metric, values in metrics.items()}
+        for name, metrics in report.items()
+    }
+
+
+def main(
+    csv_path: str = str(Path(__file__).parent.parent.parent / "data" / "rag" / "intent_labels.csv"),
+    intent: str = "specific",
+    fixed_k: int = retrieval_config.fixed_k,
+    pool_size: int = retrieval_config.pool_size,
+    max_k: int = retrieval_config.max_k,
+    strong_similarity: float = retrieval_config.strong_similarity,
+    max_gap: float = retrieval_config.max_gap,
+    min_similarity: float = retrieval_config.min_similarity,
+    generate: bool = True,
+    rounds: int = 1,
+):
+    df = pd.read_csv(csv_path)
+    questions = df.loc[df["intent"] == intent, "question"].tolist()
+    vector_store = chroma_client()
+    embeddings = vector_store.embed_queries(questions)
+
+    report = {
+        name: {"items": [], "tokens": [], "ms": []} for name in ("fixed", "adaptive")
+    }
+    selections = {"fixed": [], "adaptive": []}
+    for question, embedding in zip(questions, embeddings):
+        start = time.perf_counter()
+        fixed = vector_store.retrieve_relevant_question_sql(
+            question, k=fixed_k, threshold=min_similarity, query_embedding=embedding
+        )
+        report["fixed"]["ms"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        pool = vector_store.retrieve_relevant_question_sql(
+            question, k=pool_size, threshold=min_similarity, query_embedding=embedding
+        )
+        adaptive = select_adaptive(
+            pool, max_k=max_k, strong_similarity=strong_similarity, max_gap=max_gap
+        )
+        report["adaptive"]["ms"].append((time.perf_counter() - start) * 1000)
+
+        for name, items in (("fixed", fixed), ("adaptive", adaptive)):
+            report[name]["items"].append(len(items))
+            report[name]["tokens"].append(prompt_tokens(question, items))
+            selections[name].append(items)
+
+    summary = {
+        name: {metric: summarize(values) for metric, values in metrics.items()}
+        for name, metrics in report.items()
+    }
+    fixed_tokens = summary["fixed"]["tokens"]["mean"]
+    summary["token_reduction"] = (
+        1 - summary["adaptive"]["tokens"]["mean"] / fixed_tokens if fixed_tokens else 0.0
+    )
+    if generate:
+        summary["generation"] = asyncio.run(
+            run_generation(questions, selections, vector_store, rounds)
+        )
+        fixed_prompt_ms = (summary["generation"]["fixed"]["prompt_ms"] or {}).get("mean")
+        adaptive_prompt_ms = (summary["generation"]["adaptive"]["prompt_ms"] or {}).get("mean")
+        if fixed_prompt_ms and adaptive_prompt_ms is not None:
+            summary["prompt_ms_reduction"] = 1 - adaptive_prompt_ms / fixed_prompt_ms
+    print(f"Questions: {len(questions)}, rounds: {rounds if generate else 0}")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
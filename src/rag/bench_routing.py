@@ -0,0 +1,89 @@
+"""
+Compare the two-call and single-call (routed) generation strategies.
+
+Runs every question of the labelled CSV through both strategies against the
+configured llama-server, one at a time, and reports end-to-end latency (retrieval
+included) and how often each strategy's intent agrees with the label and with the
+other strategy. The local intent router is not used, so every intent comes from
+the LLM.
+
+    python src/rag/bench_routing.py --csv_path data/rag/intent_labels.csv
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import fire
+import numpy as np
+import pandas as pd
+
+from bench_utils import summarize
+from get_context import chroma_client, retreieve_results
+from llm import get_other_query, get_routed_answer, get_sql_query, recognise_intent
+from llm_client import close_llm_client
+
+
+async def two_call(question, vector_store):
+    intent = await recognise_intent(question)
+    if intent == "specific":
+        schema = await asyncio.to_thread(retreieve_results, vector_store, question)
+        await get_sql_query(question, vector_store, schema=schema)
+    else:
+        await get_other_query(question)
+    return intent
+
+
+async def single_call(question, vector_store):
+    schema = await asyncio.to_thread(retreieve_results, vector_store, question)
+    intent, _, _ = await get_routed_answer(question, vector_store, schema=schema)
+    return intent
+
+
+async def run(questions, labels, vector_store, rounds):
+    strategies = {"two_call": two_call, "single_call": single_call}
+    latencies = {name: [] for name in strategies}
+    intents = {name: [] for name in strategies}
+    for round_index in range(rounds):
+        for question in questions:
+            for name, strategy in strategies.items():
+                start = time.perf_counter()
+                intent = await strategy(question, vector_store)
+                latencies[name].append((time.perf_counter() - start) * 1000)
+                if round_index == 0:
+                    intents[name].append(intent)
+    await close_llm_client()
+
+    labels = np.array(labels)
+    report = {
+        name: {
+            "latency_ms": summarize(latencies[name]),
+            "label_agreement": float((np.array(intents[name]) == labels).mean()),
+        }
+        for name in strategies
+    }
+    report["strategy_agreement"] = float(
+        (np.array(intents["two_call"]) == np.array(intents["single_call"])).mean()
+    )
+    return report
+
+
+def main(
+    csv_path: str = str(Path(__file__).parent.parent.parent / "data" / "rag" / "intent_labels.csv"),
+    limit: int = 0,
+    rounds: int = 1,
+):
+    df = pd.read_csv(csv_path)
+    if limit:
+        df = df.head(limit)
+    vector_store = chroma_client()
+    report = asyncio.run(
+        run(df["question"].tolist(), df["intent"].tolist(), vector_store, rounds)
+    )
+    print(f"Questions: {len(df)}, rounds: {rounds}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
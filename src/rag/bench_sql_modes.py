@@ -0,0 +1,62 @@
+"""
+Compare the full (SQL plus explanation) and SQL-only generation modes.
+
+Runs every data question ("specific") of the labelled CSV through get_sql_query in
+both modes against the configured llama-server, one at a time, and reports decode
+tokens and generation latency per mode.
+
+    python src/rag/bench_sql_modes.py --csv_path data/rag/intent_labels.csv
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import fire
+import pandas as pd
+
+from bench_utils import summarize
+from get_context import chroma_client, retreieve_results
+from llm import get_sql_query
+from llm_client import close_llm_client
+from prompts import config as prompt_settings
+
+
+async def run(questions, vector_store, rounds):
+    schemas = [retreieve_results(vector_store, question) for question in questions]
+    report = {}
+    for mode, sql_only in (("full", False), ("sql_only", True)):
+        prompt_settings.sql_only = sql_only
+        tokens, latencies = [], []
+        for _ in range(rounds):
+            for question, schema in zip(questions, schemas):
+                start = time.perf_counter()
+                response = await get_sql_query(question, vector_store, schema=schema)
+                latencies.append((time.perf_counter() - start) * 1000)
+                usage = response.get("usage") or {}
+                if usage.get("completion_tokens") is not None:
+                    tokens.append(usage["completion_tokens"])
+        report[mode] = {
+            "latency_ms": summarize(latencies),
+            "decode_tokens": summarize(tokens) if tokens else None,
+        }
+    await close_llm_client()
+    return report
+
+
+def main(
+    csv_path: str = str(Path(__file__).parent.parent.parent / "data" / "rag" / "intent_labels.csv"),
+    intent: str = "specific",
+    rounds: int = 1,
+):
+    df = pd.read_csv(csv_path)
+    questions = df.loc[df["intent"] == intent, "question"].tolist()
+    vector_store = chroma_client()
+    report = asyncio.run(run(questions, vector_store, rounds))
+    print(f"Questions: {len(questions)}, rounds: {rounds}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,15 @@
+"""
+Helpers shared by the offline benchmark scripts.
+"""
+
+import numpy as np
+
+
+def summarize(values):
+    """Mean, median and p95 of a list of measurements."""
+    values = np.asarray(values, dtype=float)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+    }
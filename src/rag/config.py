@@ -0,0 +1,178 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class llm_config:
+    base_url: str = os.environ.get(
+        "LLM_BASE_URL", "http://localhost:8080"
+    )  # llama-server (OpenAI compatible) root url
+    model: str = os.environ.get(
+        "LLM_MODEL", "Llama-3.2-3B-Instruct-F16.gguf"
+    )  # model name sent in every completion request
+    timeout: float = float(
+        os.environ.get("LLM_TIMEOUT", 60.0)
+    )  # default per-call timeout in seconds
+    connect_timeout: float = 5.0
+    max_connections: int = 32  # upper bound on concurrent upstream connections
+    max_keepalive_connections: int = 16  # idle connections kept in the pool
+    keepalive_expiry: float = 30.0  # seconds an idle connection stays open
+    base_urls: str = os.environ.get(
+        "LLM_BASE_URLS", ""
+    )  # comma separated llama-server replicas, overrides base_url when set
+    max_failures: int = 3  # consecutive failures before a replica is ejected
+    ejection_seconds: float = 30.0  # how long an ejected replica receives no traffic
+    health_check_interval: float = 10.0  # seconds between /health polls, 0 disables them
+    health_check_timeout: float = 2.0
+    hedge: bool = (
+        os.environ.get("LLM_HEDGE", "0") == "1"
+    )  # duplicate slow requests on a second replica
+    hedge_delay: float = 2.0  # hedge delay in seconds until enough latencies are observed
+    hedge_min_samples: int = 20  # latencies of a bucket needed before hedging at its observed p95
+    latency_window: int = 500  # recent latencies kept per max_tokens bucket to estimate the p95
+
+    def urls(self):
+        if self.base_urls:
+            return [url.strip() for url in self.base_urls.split(",") if url.strip()]
+        return [self.base_url]
+
+
+@dataclass
+class pipeline_config:
+    speculative_retrieval: bool = (
+        os.environ.get("RAG_SPECULATIVE_RETRIEVAL", "1") == "1"
+    )  # run retrieval concurrently with intent classification, discard it for "general"
+    intent_router_path: str = os.environ.get(
+        "RAG_INTENT_ROUTER_PATH", str(Path(__file__).parent / "intent_router.npz")
+    )  # centroids written by train_intent_router.py, the router is disabled if missing
+    intent_router_threshold: float = float(
+        os.environ.get("RAG_INTENT_ROUTER_THRESHOLD", 0.05)
+    )  # cosine margin above which the LLM intent call is skipped
+    batch_max_concurrency: int = int(
+        os.environ.get("RAG_BATCH_MAX_CONCURRENCY", 4)
+    )  # questions of a /generate-sql/batch request in flight against the LLM at once
+    short_circuit_threshold: float = float(
+        os.environ.get("RAG_SHORT_CIRCUIT_THRESHOLD", 0.97)
+    )  # serve the stored SQL of a retrieved question at or above this similarity, 0 disables
+    fallback_budget: float = float(
+        os.environ.get("RAG_FALLBACK_BUDGET", 10.0)
+    )  # seconds before a slow SQL generation is abandoned for the best retrieved SQL, 0 disables
+    coalesce_requests: bool = (
+        os.environ.get("RAG_COALESCE_REQUESTS", "1") == "1"
+    )  # identical concurrent questions share one pipeline run
+    strategy: str = os.environ.get(
+        "RAG_PIPELINE_STRATEGY", "two_call"
+    )  # two_call (intent, then answer) or single_call (one routed completion), streaming is always two_call
+    warmup_rounds: int = int(
+        os.environ.get("RAG_WARMUP_ROUNDS", 2)
+    )  # warm-up encode + HNSW query rounds run before the worker reports ready
+
+
+@dataclass
+class retrieval_config:
+    adaptive: bool = (
+        os.environ.get("RAG_ADAPTIVE_K", "1") == "1"
+    )  # select examples by similarity gap instead of always taking fixed_k
+    fixed_k: int = 3  # examples retrieved when adaptive is off
+    pool_size: int = 8  # candidates fetched from HNSW before adaptive selection
+    max_k: int = int(os.environ.get("RAG_MAX_K", 3))  # examples kept at most
+    min_similarity: float = 0.3  # candidates below this are never used
+    strong_similarity: float = 0.85  # candidates at or above this survive a similarity gap
+    max_gap: float = 0.08  # a drop larger than this between neighbours ends the selection
+
+
+@dataclass
+class cache_config:
+    enabled: bool = os.environ.get("RAG_SEMANTIC_CACHE", "1") == "1"
+    similarity_threshold: float = float(
+        os.environ.get("RAG_CACHE_THRESHOLD", 0.95)
+    )  # cosine similarity needed to reuse a cached answer
+    max_entries: int = 2048
+    ttl_seconds: float = 3600.0  # 0 disables expiry
+    max_bytes: int = 64 * 2**20  # approximate memory bound of the cache
+    persist_path: str = os.environ.get(
+        "RAG_CACHE_PATH", ""
+    )  # json file loaded at startup and written at shutdown, empty disables persistence
+    disk_cache_path: str = os.environ.get(
+        "RAG_GENERATION_CACHE_PATH",
+        str(Path(__file__).parent / "generation_cache.sqlite"),
+    )  # sqlite file shared by all workers, empty disables the generation cache
+    disk_cache_max_bytes: int = int(
+        os.environ.get("RAG_GENERATION_CACHE_MAX_BYTES", 256 * 2**20)
+    )  # stored responses beyond this are evicted least recently used first
+
+
+@dataclass
+class embedding_config:
+    batch_window_ms: float = float(
+        os.environ.get("RAG_EMBED_BATCH_WINDOW_MS", 5.0)
+    )  # how long a query embedding waits for concurrent ones, 0 disables batching
+    max_batch_size: int = int(
+        os.environ.get("RAG_EMBED_MAX_BATCH_SIZE", 16)
+    )  # texts encoded together in a single model.encode call
+
+
+@dataclass
+class prompt_config:
+    cache_prompt: bool = (
+        os.environ.get("LLM_CACHE_PROMPT", "1") == "1"
+    )  # ask llama-server to reuse the KV cache of the common prompt prefix
+    intent_slot: int = int(
+        os.environ.get("LLM_INTENT_SLOT", -1)
+    )  # llama-server slot pinned to intent prompts, -1 lets the server choose
+    sql_slot: int = int(os.environ.get("LLM_SQL_SLOT", -1))
+    general_slot: int = int(os.environ.get("LLM_GENERAL_SLOT", -1))
+    routed_slot: int = int(os.environ.get("LLM_ROUTED_SLOT", -1))
+    explain_slot: int = int(os.environ.get("LLM_EXPLAIN_SLOT", -1))
+    intent_constraint: str = os.environ.get(
+        "LLM_INTENT_CONSTRAINT", "grammar"
+    )  # grammar (GBNF), json_schema or none (free text, the original behaviour)
+    intent_max_tokens: int = 12  # {"intent":"specific"} is well under this
+    sql_only: bool = (
+        os.environ.get("RAG_SQL_ONLY", "0") == "1"
+    )  # generate the bare SQL query, explanations come from /explain-sql on demand
+    sql_only_max_tokens: int = int(
+        os.environ.get("RAG_SQL_ONLY_MAX_TOKENS", 160)
+    )  # generation stops at the closing ";" or code fence well before this
+    explain_max_tokens: int = 256
+    compact_context: bool = (
+        os.environ.get("RAG_COMPACT_CONTEXT", "1") == "1"
+    )  # dedupe schemas and render examples as question/SQL pairs
+    context_token_budget: int = int(
+        os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", 1024)
+    )  # maximum tokens of retrieved context in the SQL prompt
+    report_token_savings: bool = (
+        os.environ.get("RAG_REPORT_TOKEN_SAVINGS", "0") == "1"
+    )  # also tokenize the raw schema dump per request to report the tokens saved
+    tokenizer_path: str = os.environ.get(
+        "RAG_TOKENIZER_PATH",
+        str(Path(__file__).parent.parent.parent / "models" / "base" / "Llama-3.2-3B-Instruct"),
+    )
+
+
+@dataclass
+class query_log_config:
+    path: str = os.environ.get(
+        "RAG_QUERY_LOG_PATH", str(Path(__file__).parent / "query_log.{pid}.jsonl")
+    )  # JSONL log of /generate-sql requests, {pid} gives each worker its own file, empty disables
+    max_bytes: int = int(
+        os.environ.get("RAG_QUERY_LOG_MAX_BYTES", 64 * 2**20)
+    )  # size at which the log is rotated to path.1, path.2, ...
+    backups: int = 5  # rotated files kept
+    flush_interval: float = 1.0  # seconds between writes of the buffered entries
+    max_buffer: int = 10000  # entries held between flushes, further entries are dropped
+
+
+@dataclass
+class admission_config:
+    max_concurrency: int = int(
+        os.environ.get("RAG_LLM_MAX_CONCURRENCY", 4)
+    )  # completions in flight at once, match the total llama-server slots
+    max_queue: int = int(
+        os.environ.get("RAG_LLM_MAX_QUEUE", 32)
+    )  # requests allowed to wait for a slot before answering 429
+    default_deadline: float = float(
+        os.environ.get("RAG_REQUEST_DEADLINE", 30.0)
+    )  # seconds a request may take when the client sends no deadline, 0 disables
+    disconnect_poll_interval: float = 0.25  # seconds between client disconnect checks
@@ -0,0 +1,135 @@
+"""
+Persistent generation cache in a single SQLite file.
+
+Entries map a key built from (normalized question, retrieval context hash, model,
+prompt version) to the generated response, so they survive restarts and are shared
+by every uvicorn worker pointing at the same file. The database runs in WAL mode
+with a busy timeout, which lets several processes read and write concurrently.
+Once the stored payload exceeds max_bytes the least recently used entries are
+deleted.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class DiskCache:
+    """
+    SQLite backed LRU cache of JSON values with a size bound.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 2**20, evict_every: int = 50):
+        """
+        Open (or create) the cache file.
+
+        Args:
+            path: Path of the SQLite database file.
+            max_bytes: Upper bound on the total size of stored values.
+            evict_every: Check the size bound once every this many writes.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(
+            path, timeout=10.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS generations_accessed ON generations (accessed_at)"
+        )
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash the JSON encoding of parts into a cache key."""
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value for key, None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE generations SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a JSON serializable value under key."""
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict()
+
+    def _evict(self):
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM generations"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until enough bytes are freed
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM generations ORDER BY accessed_at"
+        ):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.executemany("DELETE FROM generations WHERE key = ?", doomed)
+        self._conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations"
+            ).fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,13 +1,111 @@
 from vectorstore.chroma import ChromaVectorStore
+from config import embedding_config, retrieval_config
+from metrics import RETRIEVED_ITEMS, timed
 
 from pathlib import Path
 
+WARMUP_QUESTIONS = [
+    "How many singers do we have?",
+    "List all concerts held in 2022.",
+    "What is the average age of all singers?",
+    "Which stadium hosted the most concerts?",
+]
+
+retrieval = retrieval_config()
+
+
 def chroma_client():
     vector_store_path = Path(__file__).parent / "vectorstore"
     vector_store_path.mkdir(exist_ok=True, parents=True)
-    vector_store = ChromaVectorStore(persist_directory=str(vector_store_path))
+    config = embedding_config()
+    vector_store = ChromaVectorStore(
+        persist_directory=str(vector_store_path),
+        batch_window_ms=config.batch_window_ms,
+        max_batch_size=config.max_batch_size,
+    )
     return vector_store
 
-def retreieve_results(vector_store, query):
-    results = vector_store.retrieve_relevant_question_sql(query, k=3)
-    return results
\ No newline at end of file
+
+def select_adaptive(items, max_k=None, strong_similarity=None, max_gap=None):
+    """
+    Pick the retrieved items worth putting in the prompt.
+
+    Items are walked from most to least similar. An item is kept when its similarity
+    is at or above strong_similarity, or when no similarity drop larger than max_gap
+    has been seen yet. At most max_k items are kept, and the best one always is.
+    """
+    max_k = max_k if max_k is not None else retrieval.max_k
+    strong_similarity = (
+        strong_similarity if strong_similarity is not None else retrieval.strong_similarity
+    )
+    max_gap = max_gap if max_gap is not None else retrieval.max_gap
+
+    ranked = sorted(items, key=lambda item: item["similarity"], reverse=True)
+    selected = []
+    gap_seen = False
+    for i, item in enumerate(ranked):
+        if len(selected) >= max_k:
+            break
+        if i > 0 and ranked[i - 1]["similarity"] - item["similarity"] > max_gap:
+            gap_seen = True
+        if i == 0 or not gap_seen or item["similarity"] >= strong_similarity:
+            selected.append(item)
+    RETRIEVED_ITEMS.observe(len(selected))
+    return selected
+
+
+def _retrieval_params():
+    if retrieval.adaptive:
+        return {"k": retrieval.pool_size, "threshold": retrieval.min_similarity}
+    return {"k": retrieval.fixed_k, "threshold": retrieval.min_similarity}
+
+
+@timed("chroma_query")
+def _query_question_sql(vector_store, query, embedding):
+    results = vector_store.retrieve_relevant_question_sql(
+        query, query_embedding=embedding, **_retrieval_params()
+    )
+    return select_adaptive(results) if retrieval.adaptive else results
+
+
+def retreieve_results(vector_store, query, embedding=None):
+    # Embed separately so embedding and HNSW search are timed as their own stages
+    if embedding is None:
+        embedding = embed_query(vector_store, query)
+    results = _query_question_sql(vector_store, query, embedding)
+    return results
+
+
+def retreieve_results_batch(vector_store, queries, embeddings=None):
+    if embeddings is None:
+        embeddings = embed_queries(vector_store, queries)
+    return _query_question_sql_batch(vector_store, queries, embeddings)
+
+
+@timed("chroma_query")
+def _query_question_sql_batch(vector_store, queries, embeddings):
+    results = vector_store.retrieve_relevant_question_sql_batch(
+        queries, query_embeddings=embeddings, **_retrieval_params()
+    )
+    if retrieval.adaptive:
+        results = [select_adaptive(items) for items in results]
+    return results
+
+
+@timed("query_embedding")
+def embed_queries(vector_store, queries):
+    return vector_store.embed_queries(queries)
+
+
+def embed_query(vector_store, query):
+    return embed_queries(vector_store, [query])[0]
+
+
+def warm_up(vector_store, rounds=2):
+    """
+    Run representative encodes and HNSW queries so the first request is not cold.
+    """
+    for _ in range(rounds):
+        embed_queries(vector_store, WARMUP_QUESTIONS)
+        for question in WARMUP_QUESTIONS:
+            retreieve_results(vector_store, question)
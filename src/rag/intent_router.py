@@ -0,0 +1,120 @@
+"""
+In-process intent router built on the UAE-Large-V1 query embeddings.
+
+Each intent is represented by the normalized centroid of its labelled training
+embeddings. A query is routed locally when the cosine margin between the best and
+second best centroid clears a threshold, otherwise the caller falls back to the LLM.
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class CentroidIntentRouter:
+    """
+    Nearest-centroid intent classifier with a confidence margin.
+    """
+
+    def __init__(self, threshold: float = 0.05):
+        """
+        Initialize an empty router.
+
+        Args:
+            threshold: Minimum cosine margin between the top two intents for a local decision.
+        """
+        self.threshold = threshold
+        self.labels: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.fallbacks = 0
+
+    def fit(self, embeddings: Sequence[Sequence[float]], labels: Sequence[str]):
+        """
+        Compute one normalized centroid per intent.
+
+        Args:
+            embeddings: Normalized query embeddings.
+            labels: Intent label for each embedding.
+
+        Returns:
+            The fitted router.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        labels = np.asarray(labels)
+        self.labels = sorted(set(labels.tolist()))
+        if len(self.labels) < 2:
+            raise ValueError("At least two intents are needed to fit the router")
+
+        centroids = np.stack([embeddings[labels == label].mean(axis=0) for label in self.labels])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        return self
+
+    def predict(self, embedding: Sequence[float]) -> Tuple[str, float]:
+        """
+        Predict the intent of a single query.
+
+        Args:
+            embedding: Normalized query embedding.
+
+        Returns:
+            Tuple of (intent, confidence) where confidence is the cosine margin
+            between the best and second best intent.
+        """
+        scores = self.centroids @ np.asarray(embedding, dtype=np.float32)
+        order = np.argsort(scores)[::-1]
+        margin = float(scores[order[0]] - scores[order[1]])
+        return self.labels[order[0]], margin
+
+    def route(self, embedding: Sequence[float]) -> Optional[str]:
+        """
+        Return the intent when the router is confident, None when the LLM should decide.
+        """
+        intent, confidence = self.predict(embedding)
+        with self._lock:
+            if confidence >= self.threshold:
+                self.routed += 1
+                return intent
+            self.fallbacks += 1
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return routing counters and the share of requests that skipped the LLM.
+        """
+        with self._lock:
+            total = self.routed + self.fallbacks
+            return {
+                "routed_locally": self.routed,
+                "llm_fallbacks": self.fallbacks,
+                "skip_rate": self.routed / total if total else 0.0,
+                "threshold": self.threshold,
+            }
+
+    def save(self, path: str):
+        """Save the centroids, labels and threshold to an .npz file."""
+        np.savez(
+            path,
+            centroids=self.centroids,
+            labels=np.asarray(self.labels),
+            threshold=np.asarray(self.threshold),
+        )
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> "CentroidIntentRouter":
+        """
+        Load a router saved with save().
+
+        Args:
+            path: Path of the .npz file.
+            threshold: Optional override of the stored threshold.
+        """
+        data = np.load(path)
+        router = cls(
+            threshold=float(data["threshold"]) if threshold is None else threshold
+        )
+        router.labels = data["labels"].tolist()
+        router.centroids = data["centroids"]
+        return router
@@ -1,111 +1,309 @@
-import requests
-from get_context import chroma_client, retreieve_results
-import json
+import asyncio
+import time
+import httpx
+from get_context import chroma_client, retreieve_results, embed_query
+from llm_client import get_llm_client
+from llm_timings import record_call
+from prompts import (
+    clean_sql,
+    explain_request,
+    intent_request,
+    sql_mode,
+    sql_query_request,
+    other_query_request,
+    parse_intent,
+    parse_routed,
+    routed_request,
+)
+from prompts import config as prompt_settings
+from metrics import (
+    INTENT_DECODE_TOKENS,
+    INTENT_PARSE_FAILURES,
+    INTENTS,
+    SQL_DECODE_TOKENS,
+    SQL_GENERATION_LATENCY,
+    timed,
+)
+from admission import (
+    DeadlineExceeded,
+    call_timeout,
+    get_admission_controller,
+    remaining_time,
+)
 
 
-def recognise_intent(query: str):
+def _deadline_expired():
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+async def complete(data: dict, timeout: float = None):
+    # Cancelling this coroutine (client gone, deadline hit) aborts the upstream
+    # HTTP call, and llama-server frees the slot once the connection is closed.
+    async with get_admission_controller().slot():
+        try:
+            return await _complete(data, timeout=call_timeout(timeout))
+        except httpx.TimeoutException:
+            if _deadline_expired():
+                raise DeadlineExceeded("Request deadline exceeded during completion")
+            raise
+
+
+@timed("llm_completion")
+async def _complete(data: dict, timeout: float = None):
+    return await get_llm_client().chat_completion(timeout=timeout, **data)
+
+
+async def stream_complete(data: dict, timeout: float = None):
+    async with get_admission_controller().slot():
+        try:
+            async for chunk in get_llm_client().stream_chat_completion(
+                timeout=call_timeout(timeout), **data
+            ):
+                # The httpx timeout only bounds each read, enforce the total here
+                if _deadline_expired():
+                    raise DeadlineExceeded("Request deadline exceeded during streaming")
+                yield chunk
+        except httpx.TimeoutException:
+            if _deadline_expired():
+                raise DeadlineExceeded("Request deadline exceeded during streaming")
+            raise
+
+
+@timed("intent_classification")
+async def recognise_intent(query: str, timeout: float = None):
     # schema = retreieve_results(vector_store, query)
-    url = "http://localhost:8080/v1/chat/completions"
+    data = intent_request(query)
+    response = await complete(data, timeout=timeout)
+    record_call("intent", response)
+
+    mode = prompt_settings.intent_constraint
+    completion_tokens = (response.get("usage") or {}).get("completion_tokens")
+    if completion_tokens is not None:
+        INTENT_DECODE_TOKENS.labels(mode).observe(completion_tokens)
+
+    try:
+        content = response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        content = None
+    intent = parse_intent(content)
+    if intent is None:
+        INTENT_PARSE_FAILURES.labels(mode).inc()
+        intent = "general"
+    INTENTS.labels(intent, "llm").inc()
+    return intent
+
+
+async def recognise_intent_with_retrieval(
+    query: str, vector_store, timeout: float = None, embedding: list = None
+):
+    """
+    Classify the intent while the retrieval runs speculatively in a worker thread.
+
+    Returns a tuple of (intent, schema). The schema is None when the intent is not
+    "specific", in which case the retrieval result is discarded.
+    """
+    retrieval = asyncio.ensure_future(
+        asyncio.to_thread(retreieve_results, vector_store, query, embedding)
+    )
+    try:
+        intent = await recognise_intent(query, timeout=timeout)
+    except BaseException:
+        retrieval.cancel()
+        raise
+
+    if intent != "specific":
+        retrieval.cancel()
+        return intent, None
+    return intent, await retrieval
+
+
+async def route_intent(
+    query: str,
+    vector_store,
+    router,
+    timeout: float = None,
+    speculative: bool = True,
+    embedding: list = None,
+):
+    """
+    Classify the intent with the local embedding router, using the LLM only when the
+    router is not confident. The query embedding is reused for retrieval.
+
+    Returns a tuple of (intent, schema), schema is None for non "specific" intents.
+    """
+    if embedding is None:
+        embedding = await asyncio.to_thread(embed_query, vector_store, query)
+    intent = router.route(embedding)
+    if intent is not None:
+        INTENTS.labels(intent, "router").inc()
+    else:
+        if speculative:
+            return await recognise_intent_with_retrieval(
+                query, vector_store, timeout=timeout, embedding=embedding
+            )
+        intent = await recognise_intent(query, timeout=timeout)
+
+    if intent != "specific":
+        return intent, None
+    schema = await asyncio.to_thread(retreieve_results, vector_store, query, embedding)
+    return intent, schema
 
-    headers = {"Content-Type": "application/json"}
 
-    data = {
-        "model": "Llama-3.2-3B-Instruct-F16.gguf",  # your local model name; can be anything
-        "messages": [
-            {
-                "role": "system",
-                "content": """You are an AI assistant that classifies user queries as either "specific" or "general".
+def _sql_stage(mode: str) -> str:
+    return "sql_only" if mode == "sql_only" else "sql"
 
-                A "specific" query refers to something that can be answered with a factual, data-driven, or concrete response — such as those involving dates, counts, or database-style queries.
 
-                A "general" query refers to open-ended, opinion-based, or abstract questions that don't rely on structured data.
+async def get_sql_query(
+    query: str, vector_store, timeout: float = None, schema: list = None
+):
 
-                Return a JSON object in the format: {"intent": "specific"} or {"intent": "general"}
+    # Chroma and the embedding model are blocking, keep them off the event loop
+    if schema is None:
+        schema = await asyncio.to_thread(retreieve_results, vector_store, query)
 
-                Examples:
-                Query: How many users signed up in 2023?
-                {"intent": "specific"}
+    mode = sql_mode()
+    data = sql_query_request(query, schema)
+    start = time.perf_counter()
+    response = await complete(data, timeout=timeout)
+    SQL_GENERATION_LATENCY.labels(mode).observe(time.perf_counter() - start)
+    record_call(_sql_stage(mode), response)
 
-                Query: What is the capital of France?
-                {"intent": "general"}
+    completion_tokens = (response.get("usage") or {}).get("completion_tokens")
+    if completion_tokens is not None:
+        SQL_DECODE_TOKENS.labels(mode).observe(completion_tokens)
+    if mode == "sql_only" and response.get("choices"):
+        choice = response["choices"][0]
+        choice["message"]["content"] = clean_sql(
+            choice["message"].get("content"), choice.get("finish_reason")
+        )
 
-                Query: What makes a good concert experience?
-                {"intent": "general"}
+    return response
 
-                Query: List all concerts held in 2022.
-                {"intent": "specific"}
 
-                Query: How many people were there in concert between 2024 and 2025?
-                {"intent": "specific"}
+@timed("sql_explanation")
+async def explain_sql(sql: str, question: str = None, timeout: float = None):
+    data = explain_request(sql, question)
+    response = await complete(data, timeout=timeout)
+    record_call("explain", response)
 
+    return response
 
-                """,
-            },
-            {
-                "role": "user",
-                "content": query,
-            },
-        ],
-        "temperature": 0.2,
-        "max_tokens": 50,
-    }
-    response = requests.post(url, headers=headers, json=data)
+
+@timed("routed_completion")
+async def get_routed_answer(
+    query: str, vector_store, timeout: float = None, schema: list = None
+):
+    """
+    Classify and answer the question with a single completion.
+
+    Returns a tuple of (intent, answer, response). When the envelope cannot be
+    parsed the raw content is returned as a "general" answer.
+    """
+    if schema is None:
+        schema = await asyncio.to_thread(retreieve_results, vector_store, query)
+
+    data = routed_request(query, schema)
+    response = await complete(data, timeout=timeout)
+    record_call("routed", response)
 
     try:
-        intent = json.loads(response.json()["choices"][0]["message"]["content"])["intent"]
-    except:
-        intent = "general"
-    return intent
+        content = response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        content = None
+    routed = parse_routed(content)
+    if routed is None:
+        INTENT_PARSE_FAILURES.labels("routed").inc()
+        routed = ("general", content or "")
+    intent, answer = routed
+    INTENTS.labels(intent, "routed").inc()
+    return intent, answer, response
+
+
+async def get_other_query(query: str, timeout: float = None):
+
+    data = other_query_request(query)
+    response = await complete(data, timeout=timeout)
+    record_call("general", response)
+
+    return response
+
+
+async def stream_sql_query(
+    query: str, vector_store, timeout: float = None, schema: list = None
+):
+
+    if schema is None:
+        schema = await asyncio.to_thread(retreieve_results, vector_store, query)
+
+    mode = sql_mode()
+    data = sql_query_request(query, schema)
+
+    async def chunks():
+        async for chunk in stream_complete(data, timeout=timeout):
+            record_call(_sql_stage(mode), chunk)
+            yield chunk
+
+    stream = chunks() if mode != "sql_only" else _tidy_sql_stream(chunks())
+    async for chunk in stream:
+        yield chunk
+
+
+def _with_content(chunk: dict, content: str) -> dict:
+    choice = chunk["choices"][0]
+    delta = {**(choice.get("delta") or {}), "content": content}
+    return {**chunk, "choices": [{**choice, "delta": delta}, *chunk["choices"][1:]]}
+
+
+async def _tidy_sql_stream(chunks):
+    """
+    Streaming counterpart of clean_sql: hold back the start of the stream until an
+    opening code fence can be ruled out or dropped, and restore the ";" removed by
+    the stop sequence.
+    """
+    pending, started, generated = "", False, ""
+    async for chunk in chunks:
+        if not chunk.get("choices"):
+            yield chunk
+            continue
+        choice = chunk["choices"][0]
+        finished = choice.get("finish_reason") is not None
+        if not started:
+            pending += (choice.get("delta") or {}).get("content") or ""
+            head = pending.lstrip()
+            if head.startswith("```"):
+                if "\n" in head:
+                    head = head.split("\n", 1)[1].lstrip()
+                    started = True
+                elif not finished:
+                    continue
+                else:
+                    head = ""
+            elif "```".startswith(head) and not finished:
+                # Nothing or only backticks so far, could still become a fence
+                continue
+            else:
+                started = True
+            if not head and not finished:
+                started = False
+                pending = ""
+                continue
+            chunk = _with_content(chunk, head)
+
+        generated += (chunk["choices"][0].get("delta") or {}).get("content") or ""
+        yield chunk
+        if (
+            choice.get("finish_reason") == "stop"
+            and generated.strip()
+            and not generated.rstrip().endswith(";")
+        ):
+            # The stop sequence swallowed the terminating semicolon
+            yield {"model": chunk.get("model"), "choices": [{"delta": {"content": ";"}}]}
+
 
+async def stream_other_query(query: str, timeout: float = None):
 
-def get_sql_query(query: str, vector_store):
-
-    schema = retreieve_results(vector_store, query)
-    url = "http://localhost:8080/v1/chat/completions"
-
-    headers = {"Content-Type": "application/json"}
-
-    data = {
-        "model": "Llama-3.2-3B-Instruct-F16.gguf",  # your local model name; can be anything
-        "messages": [
-            {
-                "role": "system",
-                "content": " You are a helpful chatbot. Given the following database schema and natural language question, write the SQL query that answers the question and explain the query.",
-            },
-            {
-                "role": "user",
-                "content": f"Schema: {schema} -- -- {query}",
-            },
-        ],
-        "temperature": 0.2,
-        "max_tokens": 256,
-    }
-    response = requests.post(url, headers=headers, json=data)
-
-    return response.json()
-
-
-def get_other_query(query: str):
-
-    url = "http://localhost:8080/v1/chat/completions"
-
-    headers = {"Content-Type": "application/json"}
-
-    data = {
-        "model": "Llama-3.2-3B-Instruct-F16.gguf",  # your local model name; can be anything
-        "messages": [
-            {
-                "role": "system",
-                "content": " You are a helpful, concise, and knowledgeable assistant. Answer the user’s questions clearly and accurately.",
-            },
-            {
-                "role": "user",
-                "content": query,
-            },
-        ],
-        "temperature": 0.2,
-        "max_tokens": 256,
-    }
-    response = requests.post(url, headers=headers, json=data)
-
-    return response.json()
+    data = other_query_request(query)
+    async for chunk in stream_complete(data, timeout=timeout):
+        record_call("general", chunk)
+        yield chunk
@@ -0,0 +1,123 @@
+"""
+Async client for the llama-server OpenAI compatible API.
+
+Connections to each llama-server replica are pooled and kept alive between
+completions, and slow generations never block the event loop. Load balancing,
+health checks and hedging live in llm_pool.ReplicaPool.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from config import llm_config
+from llm_pool import ReplicaPool
+
+
+class LLMClient:
+    """
+    Async client for chat completions over a pool of llama-server replicas.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        config: Optional[llm_config] = None,
+        base_urls: Optional[List[str]] = None,
+    ):
+        """
+        Initialize the client. Connection pools are created lazily.
+
+        Args:
+            base_url: Root url of a single llama-server instance.
+            model: Model name sent with each request.
+            timeout: Default per-call timeout in seconds.
+            config: Optional llm_config, defaults are used when omitted.
+            base_urls: Root urls of several llama-server replicas, overrides base_url.
+        """
+        self.config = config or llm_config()
+        if base_urls is None:
+            base_urls = [base_url] if base_url else self.config.urls()
+        self.model = model or self.config.model
+        self.timeout = timeout if timeout is not None else self.config.timeout
+        self.pool = ReplicaPool(base_urls, self.config)
+
+    def _timeout(self, timeout: Optional[float]) -> httpx.Timeout:
+        return httpx.Timeout(
+            timeout if timeout is not None else self.timeout,
+            connect=self.config.connect_timeout,
+        )
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """
+        Run a chat completion against llama-server.
+
+        Args:
+            messages: OpenAI style list of chat messages.
+            timeout: Per-call timeout in seconds, overrides the client default.
+            **params: Extra completion parameters (temperature, max_tokens, ...).
+
+        Returns:
+            The decoded JSON response.
+        """
+        data = {"model": self.model, "messages": messages, **params}
+        return await self.pool.chat_completion(data, timeout=self._timeout(timeout))
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run a streaming chat completion against llama-server.
+
+        Args:
+            messages: OpenAI style list of chat messages.
+            timeout: Per-call timeout in seconds, overrides the client default.
+            **params: Extra completion parameters (temperature, max_tokens, ...).
+
+        Yields:
+            Each decoded server-sent event chunk, in order.
+        """
+        data = {"model": self.model, "messages": messages, "stream": True, **params}
+        async for line in self.pool.stream_chat_completion(
+            data, timeout=self._timeout(timeout)
+        ):
+            if not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            yield json.loads(payload)
+
+    async def aclose(self):
+        """Close the connection pools and stop health checks."""
+        await self.pool.aclose()
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process wide LLMClient, creating it on first use."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
+
+
+async def close_llm_client():
+    """Close the process wide LLMClient if it was created."""
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
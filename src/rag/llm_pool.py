@@ -0,0 +1,288 @@
+"""
+Pool of llama-server replicas.
+
+Requests go to the healthy replica with the fewest outstanding requests. Replicas
+that fail repeatedly are ejected for a cool-down period and a background task polls
+each replica's /health endpoint. Optionally a request is hedged: when the first
+replica has not answered by the observed p95 latency, a duplicate is sent to a
+second replica and whichever answers first wins. Latencies are kept per max_tokens
+bucket, so a short intent call is not hedged at the p95 of long SQL generations.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from config import llm_config
+
+
+class Replica:
+    """
+    A single llama-server endpoint with its own connection pool and health state.
+    """
+
+    def __init__(self, base_url: str, config: llm_config):
+        self.base_url = base_url.rstrip("/")
+        self.config = config
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Content-Type": "application/json"},
+                timeout=httpx.Timeout(
+                    self.config.timeout, connect=self.config.connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_keepalive_connections,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.healthy = True
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.config.max_failures:
+            self.ejected_until = time.monotonic() + self.config.ejection_seconds
+            self.consecutive_failures = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.base_url,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "ejected": time.monotonic() < self.ejected_until,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ReplicaPool:
+    """
+    Least-outstanding-requests balancer over several llama-server replicas.
+    """
+
+    def __init__(self, base_urls: List[str], config: Optional[llm_config] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            base_urls: Root urls of the llama-server replicas.
+            config: Optional llm_config, defaults are used when omitted.
+        """
+        if not base_urls:
+            raise ValueError("At least one llama-server url is required")
+        self.config = config or llm_config()
+        self.replicas = [Replica(url, self.config) for url in base_urls]
+        self.latencies: Dict[Optional[int], deque] = defaultdict(
+            lambda: deque(maxlen=self.config.latency_window)
+        )
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self._health_task: Optional[asyncio.Task] = None
+
+    def pick(self, exclude=()) -> Optional[Replica]:
+        """
+        Return the available replica with the fewest outstanding requests.
+
+        When every replica is ejected or unhealthy the least loaded one outside
+        exclude is returned anyway, so a fully degraded pool still tries.
+        """
+        now = time.monotonic()
+        candidates = [r for r in self.replicas if r not in exclude]
+        if not candidates:
+            return None
+        available = [r for r in candidates if r.available(now)] or candidates
+        fewest = min(r.outstanding for r in available)
+        return random.choice([r for r in available if r.outstanding == fewest])
+
+    @staticmethod
+    def latency_bucket(data: Dict[str, Any]) -> Optional[int]:
+        """
+        Latency window of a request: its max_tokens rounded up to a power of two,
+        None when unbounded. The decode budget dominates a completion's latency.
+        """
+        max_tokens = data.get("max_tokens")
+        if not max_tokens:
+            return None
+        return 1 << (int(max_tokens) - 1).bit_length()
+
+    def hedge_delay(self, bucket: Optional[int] = None) -> float:
+        """
+        Delay before hedging: the p95 of the bucket's recent latencies, or the
+        configured default until the bucket has enough samples.
+        """
+        latencies = self.latencies.get(bucket)
+        if latencies is None or len(latencies) < self.config.hedge_min_samples:
+            return self.config.hedge_delay
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    @asynccontextmanager
+    async def _track(self, replica: Replica):
+        replica.outstanding += 1
+        replica.requests += 1
+        try:
+            yield
+        except (httpx.TransportError, json.JSONDecodeError):
+            replica.record_failure()
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                replica.record_failure()
+            raise
+        else:
+            replica.record_success()
+        finally:
+            replica.outstanding -= 1
+
+    async def _send(
+        self, replica: Replica, data: Dict[str, Any], timeout: Optional[httpx.Timeout]
+    ) -> Dict[str, Any]:
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        start = time.monotonic()
+        async with self._track(replica):
+            response = await replica.client.post(
+                "/v1/chat/completions", json=data, **kwargs
+            )
+            response.raise_for_status()
+            result = response.json()
+        self.latencies[self.latency_bucket(data)].append(time.monotonic() - start)
+        return result
+
+    async def chat_completion(
+        self, data: Dict[str, Any], timeout: Optional[httpx.Timeout] = None
+    ) -> Dict[str, Any]:
+        """
+        Send a completion, hedging it on a second replica when enabled.
+
+        Args:
+            data: Chat completion payload.
+            timeout: Optional httpx timeout for this call.
+
+        Returns:
+            The decoded JSON response of the first replica to succeed.
+        """
+        primary = self.pick()
+        if not self.config.hedge or len(self.replicas) < 2:
+            return await self._send(primary, data, timeout)
+
+        delay = self.hedge_delay(self.latency_bucket(data))
+        tasks = {asyncio.ensure_future(self._send(primary, data, timeout)): primary}
+        hedged = False
+        error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks,
+                    timeout=None if hedged else delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    replica = tasks.pop(task)
+                    if task.exception() is None:
+                        if replica is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+
+                # Hedge once, when the primary is slow or has already failed
+                if not hedged and (not done or not tasks):
+                    hedged = True
+                    secondary = self.pick(exclude=(primary,))
+                    if secondary is not None:
+                        self.hedged_requests += 1
+                        tasks[
+                            asyncio.ensure_future(self._send(secondary, data, timeout))
+                        ] = secondary
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_chat_completion(
+        self, data: Dict[str, Any], timeout: Optional[httpx.Timeout] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion from the least loaded replica.
+
+        Yields:
+            Raw response lines.
+        """
+        replica = self.pick()
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        async with self._track(replica):
+            async with replica.client.stream(
+                "POST", "/v1/chat/completions", json=data, **kwargs
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    yield line
+
+    async def check_health(self):
+        """Poll /health on every replica and update its health flag."""
+
+        async def check(replica: Replica):
+            try:
+                response = await replica.client.get(
+                    "/health", timeout=self.config.health_check_timeout
+                )
+                replica.healthy = response.status_code == 200
+            except httpx.HTTPError:
+                replica.healthy = False
+
+        await asyncio.gather(*(check(replica) for replica in self.replicas))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.config.health_check_interval)
+
+    def start_health_checks(self):
+        """Start the background health check task on the running event loop."""
+        if self.config.health_check_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay": {
+                str(bucket): self.hedge_delay(bucket) for bucket in list(self.latencies)
+            },
+        }
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        await asyncio.gather(*(replica.aclose() for replica in self.replicas))
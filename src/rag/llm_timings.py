@@ -0,0 +1,138 @@
+"""
+Aggregation of the llama-server `timings` block per pipeline stage.
+
+llama-server reports how many prompt tokens were evaluated (prompt_n), how many were
+reused from the slot's KV cache (cache_n) and how long prompt evaluation and
+generation took. Comparing them per stage shows whether prefix reuse is working.
+
+record_call() is the single entry point for a completion's `usage` and `timings`:
+it feeds the stage totals, the per stage token and duration histograms and, when
+the current request asked for it, the request's own list of LLM calls.
+"""
+
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from metrics import LLM_PHASE_DURATION, LLM_TOKENS
+
+
+class LLMTimings:
+    """
+    Thread safe running totals of llama-server timings per stage.
+    """
+
+    FIELDS = ("prompt_n", "prompt_ms", "predicted_n", "predicted_ms", "cache_n")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"requests": 0, **{field: 0.0 for field in self.FIELDS}}
+        )
+
+    def record(self, stage: str, timings: Optional[Dict[str, Any]]):
+        """
+        Add one response's timings to the stage totals.
+
+        Args:
+            stage: Pipeline stage, e.g. "intent", "sql", "sql_only" or "general".
+            timings: The `timings` block of a llama-server response, may be None.
+        """
+        if not timings:
+            return
+        with self._lock:
+            totals = self._totals[stage]
+            totals["requests"] += 1
+            for field in self.FIELDS:
+                totals[field] += timings.get(field) or 0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return per stage averages and the share of prompt tokens served from cache."""
+        report = {}
+        with self._lock:
+            for stage, totals in self._totals.items():
+                requests = totals["requests"]
+                prompt_tokens = totals["prompt_n"] + totals["cache_n"]
+                report[stage] = {
+                    "requests": requests,
+                    "avg_prompt_tokens_evaluated": totals["prompt_n"] / requests,
+                    "avg_prompt_tokens_cached": totals["cache_n"] / requests,
+                    "avg_prompt_eval_ms": totals["prompt_ms"] / requests,
+                    "avg_generated_tokens": totals["predicted_n"] / requests,
+                    "avg_generation_ms": totals["predicted_ms"] / requests,
+                    "prompt_cache_ratio": (
+                        totals["cache_n"] / prompt_tokens if prompt_tokens else 0.0
+                    ),
+                }
+        return report
+
+
+llm_timings = LLMTimings()
+
+
+# LLM calls made on behalf of the current request, None unless it is being captured
+request_calls: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar(
+    "request_calls", default=None
+)
+
+
+def capture_calls() -> List[Dict[str, Any]]:
+    """
+    Start collecting the LLM calls of the current request, including those made in
+    tasks it spawns afterwards. Returns the list the calls are appended to.
+    """
+    calls = []
+    request_calls.set(calls)
+    return calls
+
+
+def record_call(stage: str, response: Optional[Dict[str, Any]]):
+    """
+    Record the token usage and timings of one completion.
+
+    Args:
+        stage: Pipeline stage, e.g. "intent", "sql" or "general".
+        response: A llama-server response, or the streamed chunk carrying `timings`.
+    """
+    timings = (response or {}).get("timings") or {}
+    usage = (response or {}).get("usage") or {}
+    llm_timings.record(stage, timings)
+    if not timings and not usage:
+        return
+
+    cached_tokens = timings.get("cache_n") or 0
+    prompt_tokens = usage.get("prompt_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = (timings.get("prompt_n") or 0) + cached_tokens
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = timings.get("predicted_n") or 0
+    call = {
+        "stage": stage,
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "completion_tokens": completion_tokens,
+        "prompt_ms": timings.get("prompt_ms") or 0.0,
+        "decode_ms": timings.get("predicted_ms") or 0.0,
+    }
+
+    LLM_TOKENS.labels(stage, "prompt").observe(prompt_tokens)
+    LLM_TOKENS.labels(stage, "cached").observe(cached_tokens)
+    LLM_TOKENS.labels(stage, "completion").observe(completion_tokens)
+    if timings:
+        LLM_PHASE_DURATION.labels(stage, "prompt_eval").observe(call["prompt_ms"] / 1000)
+        LLM_PHASE_DURATION.labels(stage, "decode").observe(call["decode_ms"] / 1000)
+
+    calls = request_calls.get()
+    if calls is not None:
+        calls.append(call)
+
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per call usage of a captured request together with its totals."""
+    fields = ("prompt_tokens", "cached_tokens", "completion_tokens", "prompt_ms", "decode_ms")
+    return {
+        "llm_calls": list(calls),
+        "totals": {field: sum(call[field] for call in calls) for field in fields},
+    }
@@ -0,0 +1,148 @@
+"""
+Check of admission control and request coalescing in the /generate-sql path.
+
+Serves the app and a stub llama-server in process, with a single LLM slot and the
+semantic and generation caches off, and fails with a message when:
+
+- shedding: while the slot is busy, a request whose deadline is shorter than the
+  expected queue wait is not rejected straight away with 503 and a Retry-After,
+  with coalescing on and off.
+- coalescing: a follower without a deadline that joined a leader with a short one
+  does not get its answer once the leader times out.
+
+The app loads its vector store and embedding model at startup as usual.
+
+    cd src/rag && python -m loadtest.check_admission
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import fire
+import httpx
+
+from loadtest.check_utils import InProcessServer, expect
+from loadtest.stub_llama_server import StubSettings, create_app
+
+
+async def post(client: httpx.AsyncClient, question: str, **fields):
+    payload = {"question": question, "short_circuit_threshold": 0, **fields}
+    start = time.perf_counter()
+    response = await client.post("/generate-sql", json=payload)
+    return response, time.perf_counter() - start
+
+
+async def wait_until(condition, message: str, timeout: float = 10.0):
+    give_up = time.monotonic() + timeout
+    while not condition():
+        expect(time.monotonic() < give_up, message)
+        await asyncio.sleep(0.005)
+
+
+async def check_shedding(client, admission, question: str, call_seconds: float) -> dict:
+    busy = asyncio.ensure_future(post(client, "List every singer older than 40"))
+    await wait_until(lambda: admission.active == 1, "the busy request never got the slot")
+    deadline_ms = int(call_seconds * 1000 / 2)
+    response, elapsed = await post(client, question, deadline_ms=deadline_ms)
+    await busy
+    expect(
+        response.status_code == 503,
+        f"a request that cannot start before its deadline got {response.status_code}",
+    )
+    expect("Retry-After" in response.headers, "the 503 carries no Retry-After")
+    expect(
+        elapsed < deadline_ms / 1000 / 2,
+        f"the rejection took {elapsed * 1000:.0f} ms, it waited for its deadline",
+    )
+    return {
+        "status": response.status_code,
+        "retry_after": response.headers["Retry-After"],
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+
+
+async def check_coalescing(client, coalescer, question: str, call_seconds: float) -> dict:
+    leader = asyncio.ensure_future(
+        post(client, question, deadline_ms=int(call_seconds * 1000 / 2))
+    )
+    await wait_until(lambda: coalescer.inflight() == 1, "the leader never started")
+    follower, follower_elapsed = await post(client, question)
+    leader, leader_elapsed = await leader
+    expect(
+        leader.status_code in (503, 504),
+        f"the leader outlived its deadline with {leader.status_code}",
+    )
+    expect(
+        follower.status_code == 200,
+        f"the follower failed with the leader's deadline ({follower.status_code})",
+    )
+    return {
+        "leader": {"status": leader.status_code, "elapsed_ms": round(leader_elapsed * 1000, 1)},
+        "follower": {
+            "status": follower.status_code,
+            "elapsed_ms": round(follower_elapsed * 1000, 1),
+        },
+    }
+
+
+async def run(stub_port: int, app_port: int, call_seconds: float) -> dict:
+    stub = InProcessServer(
+        create_app(
+            StubSettings(
+                distribution="fixed",
+                prompt_ms=call_seconds * 1000,
+                tokens_per_second=1000,
+                completion_tokens=8,
+            )
+        ),
+        stub_port,
+    )
+    os.environ.update(
+        {
+            "LLM_BASE_URL": stub.url,
+            "RAG_LLM_MAX_CONCURRENCY": "1",
+            "RAG_SEMANTIC_CACHE": "0",
+            "RAG_GENERATION_CACHE_PATH": "",
+            "RAG_QUERY_LOG_PATH": "",
+        }
+    )
+    # Configuration is read from the environment at import time
+    import app as rag_app
+    from admission import get_admission_controller
+
+    server = InProcessServer(rag_app.app, app_port)
+    await stub.start()
+    await server.start()
+    report = {}
+    try:
+        async with httpx.AsyncClient(base_url=server.url, timeout=60) as client:
+            # Let the admission controller observe how long a completion takes
+            warm, _ = await post(client, "How many singers do we have?")
+            expect(warm.status_code == 200, f"the warm-up request failed ({warm.status_code})")
+
+            admission = get_admission_controller()
+            for coalesce in (True, False):
+                rag_app.pipeline.coalesce_requests = coalesce
+                report[f"shedding_coalesce_{coalesce}"] = await check_shedding(
+                    client, admission, f"How many concerts were held in 201{int(coalesce)}?", call_seconds
+                )
+            rag_app.pipeline.coalesce_requests = True
+            report["coalescing"] = await check_coalescing(
+                client, rag_app.coalescer, "Which stadium hosted the most concerts?", call_seconds
+            )
+    finally:
+        await server.stop()
+        await stub.stop()
+    return report
+
+
+def main(stub_port: int = 8193, app_port: int = 8194, call_seconds: float = 1.0):
+    report = asyncio.run(run(stub_port, app_port, call_seconds))
+    print(json.dumps(report, indent=2))
+    print("OK")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,140 @@
+"""
+Checks of semantic_cache.SemanticCache and disk_cache.DiskCache.
+
+Fills both caches with synthetic entries and fails with a message when:
+
+- semantic cache: a lookup misses an identical question, hits one below the
+  similarity threshold, or eviction does not follow least recently used order,
+  the entry and byte bounds and the TTL; evicted rows are not reused, or entries
+  do not survive save() and load().
+- disk cache: the stored size exceeds max_bytes after eviction, a recently read
+  entry is evicted before older ones, or entries are not shared with a second
+  instance on the same file.
+
+    cd src/rag && python -m loadtest.check_caches
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import fire
+import numpy as np
+
+from disk_cache import DiskCache
+from loadtest.check_utils import expect
+from semantic_cache import SemanticCache
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def response(question: str, size: int = 0):
+    return {"question": question, "sql_query": "SELECT 1;" + " " * size}
+
+
+def check_semantic_cache(directory: Path, dim: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    embeddings = [unit(rng.standard_normal(dim)) for _ in range(6)]
+
+    cache = SemanticCache(threshold=0.95, max_entries=3, ttl_seconds=0)
+    cache.put("q0", embeddings[0], response("q0"))
+    hit = cache.get(embeddings[0])
+    expect(hit is not None and hit["question"] == "q0", "an identical question missed")
+    expect(abs(hit["similarity"] - 1) < 1e-5, f"self similarity is {hit['similarity']}")
+
+    # Cosine 0.9 with the stored question: under the threshold
+    orthogonal = unit(embeddings[1] - np.dot(embeddings[1], embeddings[0]) * embeddings[0])
+    near = unit(0.9 * embeddings[0] + np.sqrt(1 - 0.9**2) * orthogonal)
+    expect(cache.get(near) is None, "a question below the threshold hit")
+
+    cache.put("Q0 ", embeddings[0], response("q0 again"))
+    expect(cache.stats()["entries"] == 1, "a normalized duplicate question added an entry")
+
+    # Least recently used goes first
+    cache.put("q1", embeddings[1], response("q1"))
+    cache.put("q2", embeddings[2], response("q2"))
+    cache.get(embeddings[0])
+    cache.put("q3", embeddings[3], response("q3"))
+    expect(cache.get(embeddings[1]) is None, "the least recently used entry was kept")
+    expect(cache.get(embeddings[0]) is not None, "a recently read entry was evicted")
+    expect(cache.stats()["entries"] == 3, f"{cache.stats()['entries']} entries, bound is 3")
+
+    # Evicted rows are reused instead of growing the matrix
+    for round_index in range(50):
+        latest = unit(rng.standard_normal(dim))
+        cache.put(f"r{round_index}", latest, response("r"))
+    expect(
+        len(cache._row_keys) <= cache.max_entries + 1,
+        f"{len(cache._row_keys)} matrix rows for {cache.max_entries} entries",
+    )
+
+    # Byte bound
+    small = SemanticCache(threshold=0.95, max_entries=100, max_bytes=4 * (dim * 4 + 200))
+    for index in range(20):
+        small.put(f"b{index}", unit(rng.standard_normal(dim)), response("b", size=100))
+    stats = small.stats()
+    expect(stats["bytes"] <= small.max_bytes, f"{stats['bytes']} bytes over the bound")
+    expect(0 < stats["entries"] < 20, f"{stats['entries']} entries kept under the byte bound")
+
+    # TTL
+    expiring = SemanticCache(threshold=0.95, ttl_seconds=0.05)
+    expiring.put("t", embeddings[4], response("t"))
+    expect(expiring.get(embeddings[4]) is not None, "a fresh entry missed")
+    time.sleep(0.1)
+    expect(expiring.get(embeddings[4]) is None, "an expired entry hit")
+    expect(expiring.stats()["entries"] == 0, "an expired entry was kept")
+
+    # Persistence
+    path = str(directory / "semantic_cache.json")
+    cache.save(path)
+    loaded = SemanticCache(threshold=0.95, max_entries=3, ttl_seconds=0)
+    count = loaded.load(path)
+    expect(count == cache.stats()["entries"], f"{count} entries loaded after save")
+    expect(loaded.get(latest) is not None, "a saved entry missed after load")
+    return {"lru": cache.stats(), "byte_bound": stats}
+
+
+def check_disk_cache(directory: Path) -> dict:
+    path = str(directory / "generation_cache.sqlite")
+    value_size = len(json.dumps(response("d", size=200)))
+    cache = DiskCache(path, max_bytes=5 * value_size, evict_every=1)
+    keys = [DiskCache.make_key("question", index) for index in range(10)]
+
+    cache.put(keys[0], response("d", size=200))
+    for index, key in enumerate(keys[1:], start=1):
+        time.sleep(0.002)
+        # Keep the first entry recently used
+        expect(cache.get(keys[0]) is not None, f"the recently read entry was evicted at {index}")
+        time.sleep(0.002)
+        cache.put(key, response("d", size=200))
+        stats = cache.stats()
+        expect(stats["bytes"] <= cache.max_bytes, f"{stats['bytes']} bytes over the bound")
+    expect(cache.get(keys[1]) is None, "the least recently used entry was kept")
+    expect(cache.get(keys[-1]) is not None, "the newest entry was evicted")
+
+    other = DiskCache(path, max_bytes=cache.max_bytes)
+    expect(other.get(keys[-1]) is not None, "a second instance does not see the entries")
+    other.put("shared", {"sql_query": "SELECT 2;"})
+    expect(cache.get("shared") is not None, "a write from a second instance is not seen")
+    stats = cache.stats()
+    other.close()
+    cache.close()
+    return stats
+
+
+def main(dim: int = 64, seed: int = 0):
+    with tempfile.TemporaryDirectory() as directory:
+        report = {
+            "semantic_cache": check_semantic_cache(Path(directory), dim, seed),
+            "disk_cache": check_disk_cache(Path(directory)),
+        }
+    print(json.dumps(report, indent=2))
+    print("OK")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
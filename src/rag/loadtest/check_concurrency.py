@@ -0,0 +1,203 @@
+"""
+Checks of admission.AdmissionController and singleflight.SingleFlight.
+
+Runs both on the event loop with dummy work instead of LLM calls and fails with a
+message when:
+
+- admission: a request is not rejected with 429 when the queue is full, or with
+  503 when it cannot start before its deadline (from the expected wait, or after
+  waiting for it), an expired deadline does not raise DeadlineExceeded, or the
+  active and waiting counts do not return to zero, cancelled waiters included.
+- coalescing: identical concurrent calls do not share one run and its result or
+  error, one caller going away cancels the shared run for the others, or the last
+  caller going away does not cancel it.
+
+    cd src/rag && python -m loadtest.check_concurrency
+"""
+
+import asyncio
+import json
+import time
+
+import fire
+
+from admission import AdmissionController, DeadlineExceeded, Overloaded, set_deadline
+from loadtest.check_utils import expect
+from singleflight import SingleFlight
+
+
+async def hold_slot(controller: AdmissionController, release: asyncio.Event, deadline=None):
+    set_deadline(deadline)
+    async with controller.slot():
+        await release.wait()
+
+
+async def rejection(controller: AdmissionController, deadline=None):
+    """Try to get a slot, return (exception, seconds taken)."""
+    set_deadline(deadline)
+    start = time.perf_counter()
+    try:
+        async with controller.slot():
+            pass
+    except (Overloaded, DeadlineExceeded) as e:
+        return e, time.perf_counter() - start
+    return None, time.perf_counter() - start
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def check_admission(service_seconds: float) -> dict:
+    controller = AdmissionController(max_concurrency=1, max_queue=1)
+    report = {}
+
+    # Deadline wait: no service time observed yet, so the request queues and times out
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold_slot(controller, release))
+    await settle()
+    error, elapsed = await rejection(controller, deadline=service_seconds)
+    expect(
+        isinstance(error, Overloaded) and error.status_code == 503,
+        f"a request that waited out its deadline got {error!r}",
+    )
+    expect(elapsed >= service_seconds * 0.9, "the deadline rejection came before the deadline")
+    report["deadline_wait"] = {"reason": error.reason, "elapsed_ms": round(elapsed * 1000, 1)}
+    await asyncio.sleep(service_seconds)
+    release.set()
+    await holder
+    expect(controller.service_time is not None, "the slot hold time was not observed")
+
+    # Queue full and deadline estimate, with the slot held and one request queued
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold_slot(controller, release))
+    await settle()
+    queued = asyncio.ensure_future(hold_slot(controller, release))
+    await settle()
+    expect(controller.waiting == 1, f"{controller.waiting} requests queued, expected 1")
+    error, elapsed = await rejection(controller)
+    expect(
+        isinstance(error, Overloaded) and error.status_code == 429,
+        f"a request over the queue bound got {error!r}",
+    )
+    expect(elapsed < 0.05, "the queue-full rejection was not immediate")
+    report["queue_full"] = {"reason": error.reason, "retry_after": error.retry_after}
+
+    controller.max_queue = 2
+    error, elapsed = await rejection(controller, deadline=controller.service_time / 4)
+    expect(
+        isinstance(error, Overloaded) and error.status_code == 503,
+        f"a request that cannot start before its deadline got {error!r}",
+    )
+    expect(elapsed < 0.05, "the deadline estimate rejection was not immediate")
+    expect(error.retry_after >= 1, "the deadline rejection carries no Retry-After")
+    report["deadline_estimate"] = {"reason": error.reason, "retry_after": error.retry_after}
+
+    # A queued request that goes away leaves the queue
+    cancelled = asyncio.ensure_future(hold_slot(controller, release))
+    await settle()
+    expect(controller.waiting == 2, f"{controller.waiting} requests queued, expected 2")
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    expect(controller.waiting == 1, "a cancelled request stayed in the queue")
+
+    release.set()
+    await asyncio.gather(holder, queued)
+    expect(
+        controller.active == 0 and controller.waiting == 0,
+        f"slots leaked: {controller.stats()}",
+    )
+
+    error, _ = await rejection(controller, deadline=None)
+    expect(error is None, f"an idle controller rejected a request: {error!r}")
+    set_deadline(0.001)
+    await asyncio.sleep(0.01)
+    try:
+        async with controller.slot():
+            pass
+        expect(False, "an expired deadline was admitted")
+    except DeadlineExceeded:
+        pass
+    report["stats"] = controller.stats()
+    return report
+
+
+async def check_coalescing() -> dict:
+    flight = SingleFlight(name="check")
+    runs = []
+    cancelled = []
+    release = asyncio.Event()
+
+    async def work(value):
+        runs.append(value)
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.append(value)
+            raise
+        if value == "fail":
+            raise ValueError("shared failure")
+        return value
+
+    # Identical calls share one run and its result
+    callers = [asyncio.ensure_future(flight.do("a", lambda: work("a"))) for _ in range(3)]
+    await settle()
+    expect(flight.joins("a"), "the key is not in flight")
+    release.set()
+    results = await asyncio.gather(*callers)
+    expect(runs == ["a"], f"{len(runs)} runs for 3 identical calls")
+    expect(results == ["a"] * 3, f"callers got {results}")
+    expect(flight.inflight() == 0, "a finished key stayed in flight")
+
+    # An error reaches every caller and the key is retried afterwards
+    release = asyncio.Event()
+    callers = [asyncio.ensure_future(flight.do("b", lambda: work("fail"))) for _ in range(2)]
+    await settle()
+    release.set()
+    errors = await asyncio.gather(*callers, return_exceptions=True)
+    expect(
+        all(isinstance(e, ValueError) for e in errors),
+        f"callers did not all get the shared error: {errors}",
+    )
+    expect(not flight.joins("b"), "a failed key stayed in flight")
+
+    # One caller leaving does not cancel the run, the last one does
+    runs.clear()
+    release = asyncio.Event()
+    first = asyncio.ensure_future(flight.do("c", lambda: work("c")))
+    second = asyncio.ensure_future(flight.do("c", lambda: work("c")))
+    await settle()
+    first.cancel()
+    await settle()
+    expect(not cancelled, "one caller going away cancelled the shared run")
+    release.set()
+    expect(await second == "c", "the remaining caller lost its result")
+
+    release = asyncio.Event()
+    callers = [asyncio.ensure_future(flight.do("d", lambda: work("d"))) for _ in range(2)]
+    await settle()
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await settle()
+    expect(cancelled == ["d"], "the shared run outlived every caller")
+    expect(flight.inflight() == 0, "a cancelled key stayed in flight")
+    return {"cancelled": cancelled}
+
+
+async def run(service_seconds: float) -> dict:
+    return {
+        "admission": await check_admission(service_seconds),
+        "coalescing": await check_coalescing(),
+    }
+
+
+def main(service_seconds: float = 0.1):
+    report = asyncio.run(run(service_seconds))
+    print(json.dumps(report, indent=2))
+    print("OK")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
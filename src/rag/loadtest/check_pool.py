@@ -0,0 +1,166 @@
+"""
+End-to-end check of llm_pool.ReplicaPool against two stub llama-servers.
+
+Starts two stub servers in process and drives a pool over them through three
+scenarios, failing with a message when the pool does not behave as expected:
+
+- hedging: one replica is slow, so requests are duplicated on the other one, which
+  wins; the hedge delay is learned per max_tokens bucket.
+- ejection: one replica fails every request and is ejected after max_failures
+  consecutive failures, after which all traffic goes to the other one.
+- health loop: one replica is stopped, the background /health poll marks it
+  unhealthy and then healthy again once it is back.
+
+    cd src/rag && python -m loadtest.check_pool
+"""
+
+import asyncio
+import json
+import random
+
+import fire
+import httpx
+
+from config import llm_config
+from llm_pool import ReplicaPool
+from loadtest.check_utils import InProcessServer, expect
+from loadtest.stub_llama_server import StubSettings, create_app
+
+REQUEST = {
+    "model": "stub-llama",
+    "messages": [{"role": "user", "content": "How many singers do we have?"}],
+    "max_tokens": 16,
+}
+
+
+class StubServer(InProcessServer):
+    def __init__(self, port: int, settings: StubSettings):
+        super().__init__(create_app(settings), port)
+        self.settings = settings
+
+    async def start(self):
+        await super().start()
+        # The first completion of a fresh server is slow, keep it out of the checks
+        async with httpx.AsyncClient(base_url=self.url) as client:
+            await client.post("/v1/chat/completions", json=REQUEST)
+
+
+def stub_settings(**kwargs) -> StubSettings:
+    return StubSettings(
+        distribution="fixed", prompt_ms=10, tokens_per_second=1000, seed=0, **kwargs
+    )
+
+
+def pool_config(**kwargs) -> llm_config:
+    return llm_config(**{"hedge": False, "health_check_interval": 0, **kwargs})
+
+
+async def check_hedging(fast: StubServer, slow: StubServer, requests: int) -> dict:
+    slow.settings.prompt_ms = 1000
+    config = pool_config(hedge=True, hedge_delay=0.2, hedge_min_samples=5)
+    pool = ReplicaPool([fast.url, slow.url], config)
+    try:
+        for _ in range(requests):
+            await pool.chat_completion(REQUEST)
+            # Let the cancelled loser release its replica before the next pick
+            await asyncio.sleep(0.05)
+        stats = pool.stats()
+        bucket = pool.latency_bucket(REQUEST)
+        expect(stats["hedged_requests"] > 0, "no request was hedged")
+        expect(stats["hedge_wins"] > 0, "the hedge never beat the slow replica")
+        expect(
+            pool.hedge_delay(bucket) < config.hedge_delay,
+            "the hedge delay was not learned from the bucket's latencies",
+        )
+        expect(
+            pool.hedge_delay(pool.latency_bucket({"max_tokens": 256})) == config.hedge_delay,
+            "an unseen max_tokens bucket does not use the default hedge delay",
+        )
+        return stats
+    finally:
+        slow.settings.prompt_ms = 10
+        await pool.aclose()
+
+
+async def check_ejection(good: StubServer, bad: StubServer, requests: int) -> dict:
+    bad.settings.error_rate = 1.0
+    config = pool_config(max_failures=3, ejection_seconds=30)
+    pool = ReplicaPool([good.url, bad.url], config)
+    outcomes = []
+    try:
+        for _ in range(requests):
+            try:
+                await pool.chat_completion(REQUEST)
+                outcomes.append(True)
+            except httpx.HTTPStatusError:
+                outcomes.append(False)
+        stats = pool.stats()
+        good_stats, bad_stats = stats["replicas"]
+        expect(bad_stats["ejected"], "the failing replica was not ejected")
+        expect(
+            bad_stats["failures"] == config.max_failures,
+            f"the ejected replica still got traffic ({bad_stats['failures']} failures)",
+        )
+        expect(all(outcomes[-5:]), "requests failed after the ejection")
+        expect(not good_stats["ejected"], "the healthy replica was ejected")
+        return stats
+    finally:
+        bad.settings.error_rate = 0.0
+        await pool.aclose()
+
+
+async def check_health_loop(up: StubServer, down: StubServer, interval: float) -> dict:
+    config = pool_config(health_check_interval=interval, health_check_timeout=0.5)
+    pool = ReplicaPool([up.url, down.url], config)
+    try:
+        pool.start_health_checks()
+        await asyncio.sleep(2 * interval)
+        expect(all(r.healthy for r in pool.replicas), "replicas not healthy at start")
+
+        await down.stop()
+        await asyncio.sleep(3 * interval)
+        expect(not pool.replicas[1].healthy, "the stopped replica is still healthy")
+        picked = {pool.pick().base_url for _ in range(20)}
+        expect(picked == {up.url}, "requests are still routed to the stopped replica")
+        await pool.chat_completion(REQUEST)
+
+        await down.start()
+        await asyncio.sleep(3 * interval)
+        expect(pool.replicas[1].healthy, "the restarted replica is not healthy again")
+        return pool.stats()
+    finally:
+        await pool.aclose()
+
+
+async def run(port_a: int, port_b: int, requests: int, interval: float) -> dict:
+    a = StubServer(port_a, stub_settings())
+    b = StubServer(port_b, stub_settings())
+    await a.start()
+    await b.start()
+    try:
+        return {
+            "hedging": await check_hedging(a, b, requests),
+            "ejection": await check_ejection(a, b, requests),
+            "health_loop": await check_health_loop(a, b, interval),
+        }
+    finally:
+        await a.stop()
+        await b.stop()
+
+
+def main(
+    port_a: int = 8191,
+    port_b: int = 8192,
+    requests: int = 20,
+    interval: float = 0.2,
+    seed: int = 0,
+):
+    # Replica choice between equally loaded replicas is random
+    random.seed(seed)
+    report = asyncio.run(run(port_a, port_b, requests, interval))
+    print(json.dumps(report, indent=2))
+    print("OK")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,129 @@
+"""
+Checks of the retrieved example selection and of the SQL-only output clean-up.
+
+Runs get_context.select_adaptive, prompts.clean_sql and llm._tidy_sql_stream on
+hand written inputs and fails with a message when an output differs from the
+expected one:
+
+- select_adaptive: the best item is always kept, a similarity drop larger than
+  max_gap ends the selection except for strong items, at most max_k are kept.
+- clean_sql and _tidy_sql_stream: an opening code fence is dropped (in the stream
+  also when it is split across chunks), the ";" swallowed by the stop sequence is
+  restored on finish_reason "stop" only, and nothing else is changed.
+
+    cd src/rag && python -m loadtest.check_sql_output
+"""
+
+import asyncio
+import json
+
+import fire
+
+from get_context import select_adaptive
+from llm import _tidy_sql_stream
+from loadtest.check_utils import expect
+from prompts import clean_sql
+
+SELECTION_CASES = [
+    # (similarities, max_k, strong_similarity, max_gap, similarities kept)
+    ([], 3, 0.85, 0.08, []),
+    ([0.4], 3, 0.85, 0.08, [0.4]),
+    ([0.9, 0.88, 0.7, 0.69], 3, 0.85, 0.08, [0.9, 0.88]),
+    ([0.7, 0.9, 0.88, 0.69], 3, 0.85, 0.08, [0.9, 0.88]),
+    ([0.97, 0.86, 0.6], 3, 0.85, 0.08, [0.97, 0.86]),
+    ([0.97, 0.7, 0.86], 3, 0.85, 0.08, [0.97, 0.86]),
+    ([0.9, 0.89, 0.88, 0.87, 0.86], 3, 0.95, 0.08, [0.9, 0.89, 0.88]),
+    ([0.5, 0.3], 3, 0.85, 0.08, [0.5]),
+]
+
+CLEAN_CASES = [
+    # (content, finish_reason, expected)
+    ("SELECT 1", "stop", "SELECT 1;"),
+    ("SELECT 1;", "stop", "SELECT 1;"),
+    ("```sql\nSELECT name FROM singer", "stop", "SELECT name FROM singer;"),
+    ("  ```\nSELECT 1\n", "stop", "SELECT 1;"),
+    ("SELECT name FROM", "length", "SELECT name FROM"),
+    ("```", "stop", ""),
+    ("", "stop", ""),
+    (None, None, ""),
+]
+
+STREAM_CASES = [
+    # (content chunks, finish_reason, expected text)
+    (["SELECT ", "1"], "stop", "SELECT 1;"),
+    (["SELECT 1;"], "stop", "SELECT 1;"),
+    (["```sql\n", "SELECT ", "1"], "stop", "SELECT 1;"),
+    (["``", "`sq", "l\nSEL", "ECT 1"], "stop", "SELECT 1;"),
+    (["  ", "```", "\n", "SELECT 1"], "stop", "SELECT 1;"),
+    (["SELECT name ", "FROM"], "length", "SELECT name FROM"),
+    (["``", "`"], "stop", ""),
+    ([], "stop", ""),
+]
+
+
+def check_selection() -> int:
+    for similarities, max_k, strong, max_gap, expected in SELECTION_CASES:
+        items = [{"id": str(i), "similarity": s} for i, s in enumerate(similarities)]
+        selected = select_adaptive(items, max_k=max_k, strong_similarity=strong, max_gap=max_gap)
+        kept = [item["similarity"] for item in selected]
+        expect(kept == expected, f"select_adaptive({similarities}) kept {kept}, expected {expected}")
+    return len(SELECTION_CASES)
+
+
+def check_clean_sql() -> int:
+    for content, finish_reason, expected in CLEAN_CASES:
+        cleaned = clean_sql(content, finish_reason)
+        expect(
+            cleaned == expected,
+            f"clean_sql({content!r}, {finish_reason!r}) gave {cleaned!r}, expected {expected!r}",
+        )
+    return len(CLEAN_CASES)
+
+
+async def tidy(pieces, finish_reason):
+    async def chunks():
+        for piece in pieces:
+            yield {"model": "stub", "choices": [{"index": 0, "delta": {"content": piece}}]}
+        # Chunks without choices (usage only) pass through untouched
+        yield {"model": "stub", "choices": [], "usage": {"completion_tokens": len(pieces)}}
+        yield {
+            "model": "stub",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+        }
+
+    text, passed_through = "", 0
+    async for chunk in _tidy_sql_stream(chunks()):
+        if not chunk.get("choices"):
+            passed_through += 1
+            continue
+        text += (chunk["choices"][0].get("delta") or {}).get("content") or ""
+    return text, passed_through
+
+
+async def check_stream() -> int:
+    for pieces, finish_reason, expected in STREAM_CASES:
+        text, passed_through = await tidy(pieces, finish_reason)
+        expect(
+            text == expected,
+            f"_tidy_sql_stream({pieces}, {finish_reason!r}) gave {text!r}, expected {expected!r}",
+        )
+        expect(passed_through == 1, f"_tidy_sql_stream({pieces}) dropped a usage chunk")
+        expect(
+            text == clean_sql("".join(pieces), finish_reason),
+            f"_tidy_sql_stream({pieces}) disagrees with clean_sql",
+        )
+    return len(STREAM_CASES)
+
+
+def main():
+    report = {
+        "select_adaptive": check_selection(),
+        "clean_sql": check_clean_sql(),
+        "tidy_sql_stream": asyncio.run(check_stream()),
+    }
+    print(json.dumps({name: f"{cases} cases" for name, cases in report.items()}, indent=2))
+    print("OK")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,41 @@
+"""
+Helpers shared by the runnable checks in this directory (check_*.py).
+"""
+
+import asyncio
+
+import uvicorn
+
+
+def expect(condition: bool, message: str):
+    if not condition:
+        raise SystemExit(f"FAILED: {message}")
+
+
+class InProcessServer:
+    """
+    An ASGI app served by uvicorn on the running event loop, lifespan included.
+    """
+
+    def __init__(self, app, port: int):
+        self.app = app
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self._server = None
+        self._task = None
+
+    async def start(self):
+        config = uvicorn.Config(
+            self.app, host="127.0.0.1", port=self.port, log_level="warning"
+        )
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.ensure_future(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+                raise SystemExit(f"FAILED: server on port {self.port} did not start")
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        self._server.should_exit = True
+        await self._task
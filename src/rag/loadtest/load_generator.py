@@ -0,0 +1,201 @@
+"""
+Load generator for the /generate-sql endpoint.
+
+Runs either open loop at a target request rate (Poisson arrivals) or closed loop
+with a fixed number of concurrent clients, and prints a JSON report with latency
+percentiles, throughput and error rate.
+
+    python src/rag/loadtest/load_generator.py --rps 5 --duration 60
+    python src/rag/loadtest/load_generator.py --concurrency 16 --requests 500
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+import fire
+import httpx
+
+DEFAULT_QUESTIONS = [
+    "How many singers do we have?",
+    "List all concerts held in 2022.",
+    "What is the average age of all singers?",
+    "Which stadium hosted the most concerts?",
+    "Show the name and capacity of every stadium.",
+    "What is the capital of France?",
+    "Why do people enjoy live music?",
+]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of values, q in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def load_questions(path: Optional[str]) -> List[str]:
+    """Read questions from a .txt file (one per line) or a CSV with a question column."""
+    if not path:
+        return DEFAULT_QUESTIONS
+    path = Path(path)
+    if path.suffix == ".csv":
+        import pandas as pd
+
+        return pd.read_csv(path)["question"].dropna().tolist()
+    return [line.strip() for line in path.read_text().splitlines() if line.strip()]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+    def record(self, latency: float, status):
+        self.latencies.append(latency)
+        self.statuses[str(status)] += 1
+        if status == "exception" or int(status) >= 400:
+            self.errors += 1
+
+    def report(self, elapsed: float, **extra) -> dict:
+        total = len(self.latencies)
+        latencies = self.latencies
+        return {
+            **extra,
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": self.errors / total if total else 0.0,
+            "duration_s": elapsed,
+            "throughput_rps": (total - self.errors) / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "p50": _ms(percentile(latencies, 50)),
+                "p95": _ms(percentile(latencies, 95)),
+                "p99": _ms(percentile(latencies, 99)),
+                "mean": _ms(sum(latencies) / len(latencies)) if latencies else None,
+                "max": _ms(max(latencies)) if latencies else None,
+            },
+            "status_codes": dict(self.statuses),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, payload: dict, recorder: Recorder):
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=payload)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = "exception"
+    recorder.record(time.perf_counter() - start, status)
+
+
+async def run_load(
+    url: str = "http://127.0.0.1:8000",
+    endpoint: str = "/generate-sql",
+    questions: Optional[List[str]] = None,
+    rps: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    duration: float = 30.0,
+    requests: Optional[int] = None,
+    timeout: float = 120.0,
+    extra_payload: Optional[dict] = None,
+    seed: int = 42,
+) -> dict:
+    """
+    Drive the service and return the report dict.
+
+    Args:
+        url: Root url of the RAG service.
+        endpoint: Path to POST to.
+        questions: Questions to sample from.
+        rps: Open loop target request rate, Poisson arrivals.
+        concurrency: Closed loop number of clients, used when rps is not set.
+        duration: Seconds to run for.
+        requests: Optional cap on the number of requests sent.
+        timeout: Client timeout per request.
+        extra_payload: Extra fields merged into every request body.
+        seed: Seed for question sampling and arrival times.
+    """
+    questions = questions or DEFAULT_QUESTIONS
+    rng = random.Random(seed)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    def payload():
+        return {"question": rng.choice(questions), **(extra_payload or {})}
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        stop_at = start + duration
+        sent = 0
+
+        if rps:
+            tasks = []
+            next_at = start
+            while time.perf_counter() < stop_at and (requests is None or sent < requests):
+                tasks.append(asyncio.ensure_future(send(client, endpoint, payload(), recorder)))
+                sent += 1
+                next_at += rng.expovariate(rps)
+                await asyncio.sleep(max(0, next_at - time.perf_counter()))
+            await asyncio.gather(*tasks)
+            mode = {"mode": "open_loop", "target_rps": rps}
+        else:
+            concurrency = concurrency or 1
+
+            async def client_loop():
+                nonlocal sent
+                while time.perf_counter() < stop_at and (requests is None or sent < requests):
+                    sent += 1
+                    await send(client, endpoint, payload(), recorder)
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+            mode = {"mode": "closed_loop", "concurrency": concurrency}
+
+        elapsed = time.perf_counter() - start
+
+    return recorder.report(elapsed, endpoint=endpoint, **mode)
+
+
+def main(
+    url: str = "http://127.0.0.1:8000",
+    endpoint: str = "/generate-sql",
+    questions_path: str = None,
+    rps: float = None,
+    concurrency: int = None,
+    duration: float = 30.0,
+    requests: int = None,
+    timeout: float = 120.0,
+    output_path: str = None,
+    seed: int = 42,
+):
+    report = asyncio.run(
+        run_load(
+            url=url,
+            endpoint=endpoint,
+            questions=load_questions(questions_path),
+            rps=rps,
+            concurrency=concurrency,
+            duration=duration,
+            requests=requests,
+            timeout=timeout,
+            seed=seed,
+        )
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output_path:
+        Path(output_path).write_text(text)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,164 @@
+"""
+Replay a captured query log against the /generate-sql endpoint.
+
+Reads the JSONL written by the service's query log, merging the per-worker files
+matched by a glob and their rotated files, and re-sends every request with its
+original payload at the original inter-arrival times, optionally sped up or slowed
+down. Arrivals are open loop, so repetition and
+bursts reach the service as they were captured. Prints a JSON report with the
+replayed latencies next to the ones recorded in the log.
+
+    python src/rag/loadtest/replay.py --log_path "src/rag/query_log.*.jsonl"
+    python src/rag/loadtest/replay.py --log_path "src/rag/query_log.*.jsonl" --speed 4 --max_gap 5
+"""
+
+import asyncio
+import glob
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+import fire
+import httpx
+
+from load_generator import Recorder, percentile, send
+
+
+def load_log(log_path: str, include_rotated: bool = True) -> List[dict]:
+    """
+    Read the entries of every log file matching the log_path glob (and their rotated
+    files), oldest first.
+    """
+    paths = set(glob.glob(log_path))
+    if include_rotated:
+        paths.update(
+            rotated
+            for path in list(paths)
+            for rotated in glob.glob(f"{glob.escape(path)}.[0-9]*")
+        )
+    entries = []
+    for path in sorted(paths):
+        for line in Path(path).read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A worker killed mid-write leaves a truncated last line
+                continue
+    entries = [entry for entry in entries if entry.get("question")]
+    return sorted(entries, key=lambda entry: entry["ts"])
+
+
+def schedule(entries: List[dict], speed: float = 1.0, max_gap: Optional[float] = None):
+    """Offsets in seconds from the start of the replay, one per entry."""
+    offsets, offset = [], 0.0
+    for previous, entry in zip([None] + entries[:-1], entries):
+        if previous is not None:
+            gap = max(0.0, entry["ts"] - previous["ts"])
+            if max_gap is not None:
+                gap = min(gap, max_gap)
+            offset += gap / speed
+        offsets.append(offset)
+    return offsets
+
+
+def _ms_summary(latencies_ms: List[float]) -> dict:
+    return {
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+    }
+
+
+async def replay(
+    entries: List[dict],
+    url: str = "http://127.0.0.1:8000",
+    endpoint: str = "/generate-sql",
+    speed: float = 1.0,
+    max_gap: Optional[float] = None,
+    timeout: float = 120.0,
+    extra_payload: Optional[dict] = None,
+) -> dict:
+    """
+    Re-send the logged requests at their scheduled offsets and return the report dict.
+
+    Args:
+        entries: Log entries, oldest first.
+        url: Root url of the RAG service.
+        endpoint: Path to POST to.
+        speed: Arrival time scale, 2.0 replays twice as fast as captured.
+        max_gap: Optional cap in seconds on a captured inter-arrival gap.
+        timeout: Client timeout per request.
+        extra_payload: Extra fields merged into every request body.
+    """
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    offsets = schedule(entries, speed=speed, max_gap=max_gap)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        tasks = []
+        for entry, offset in zip(entries, offsets):
+            await asyncio.sleep(max(0, start + offset - time.perf_counter()))
+            payload = {**(entry.get("request") or {"question": entry["question"]})}
+            payload.update(extra_payload or {})
+            tasks.append(asyncio.ensure_future(send(client, endpoint, payload, recorder)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    captured = [entry["total_ms"] for entry in entries if entry.get("total_ms") is not None]
+    span = entries[-1]["ts"] - entries[0]["ts"] if entries else 0.0
+    return recorder.report(
+        elapsed,
+        endpoint=endpoint,
+        mode="replay",
+        speed=speed,
+        captured={
+            "requests": len(entries),
+            "duration_s": span,
+            "unique_questions": len({entry["question"].strip().lower() for entry in entries}),
+            "cache": dict(Counter(entry.get("cache") for entry in entries)),
+            "intents": dict(Counter(str(entry.get("intent")) for entry in entries)),
+            "latency_ms": _ms_summary(captured),
+        },
+    )
+
+
+def main(
+    log_path: str,
+    url: str = "http://127.0.0.1:8000",
+    endpoint: str = "/generate-sql",
+    speed: float = 1.0,
+    max_gap: float = None,
+    limit: int = None,
+    include_rotated: bool = True,
+    timeout: float = 120.0,
+    output_path: str = None,
+):
+    entries = load_log(log_path, include_rotated=include_rotated)
+    if limit:
+        entries = entries[:limit]
+    if not entries:
+        raise SystemExit(f"No entries in {log_path}")
+    report = asyncio.run(
+        replay(
+            entries,
+            url=url,
+            endpoint=endpoint,
+            speed=speed,
+            max_gap=max_gap,
+            timeout=timeout,
+        )
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output_path:
+        Path(output_path).write_text(text)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
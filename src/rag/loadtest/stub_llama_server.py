@@ -0,0 +1,204 @@
+"""
+Stub llama-server for offline benchmarking.
+
+Implements the parts of the OpenAI compatible API the RAG service uses
+(/v1/chat/completions, streaming and blocking, and /health). Latency is simulated as
+a prompt-eval delay drawn from a configurable distribution followed by decoding at a
+fixed token rate, with a limited number of parallel slots like llama-server's -np.
+Responses carry usage and timings blocks shaped like the real server's.
+
+    python src/rag/loadtest/stub_llama_server.py --port 8080 --slots 4 --tokens_per_second 40
+"""
+
+import asyncio
+import json
+import random
+import time
+
+import fire
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SQL_ANSWER = "SELECT count(*) FROM singer;"
+GENERAL_ANSWER = "This is a stub answer from the load-test server."
+
+
+class StubSettings:
+    def __init__(
+        self,
+        distribution: str = "lognormal",
+        prompt_ms: float = 150.0,
+        prompt_sigma: float = 0.5,
+        tokens_per_second: float = 40.0,
+        completion_tokens: int = 64,
+        slots: int = 4,
+        error_rate: float = 0.0,
+        model: str = "stub-llama",
+        seed: int = None,
+    ):
+        self.distribution = distribution
+        self.prompt_ms = prompt_ms
+        self.prompt_sigma = prompt_sigma
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.slots = slots
+        self.error_rate = error_rate
+        self.model = model
+        self.random = random.Random(seed)
+
+    def prompt_delay(self) -> float:
+        """Prompt evaluation delay in seconds."""
+        if self.distribution == "fixed":
+            ms = self.prompt_ms
+        elif self.distribution == "uniform":
+            ms = self.random.uniform(0, 2 * self.prompt_ms)
+        elif self.distribution == "exponential":
+            ms = self.random.expovariate(1 / self.prompt_ms)
+        elif self.distribution == "lognormal":
+            # Median prompt_ms, long right tail controlled by prompt_sigma
+            ms = self.prompt_ms * self.random.lognormvariate(0, self.prompt_sigma)
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        return ms / 1000
+
+
+def stub_intent(question: str) -> str:
+    # Routed prompts carry the schema before the question
+    for marker in ("### Question:\n", "-- -- "):
+        question = question.rpartition(marker)[2] if marker in question else question
+    return "general" if question.lower().startswith(("what is", "why", "tell")) else "specific"
+
+
+def answer_for(body: dict) -> str:
+    system = body["messages"][0]["content"] if body.get("messages") else ""
+    question = body["messages"][-1]["content"] if body.get("messages") else ""
+    if '"answer"' in system:
+        intent = stub_intent(question)
+        answer = SQL_ANSWER if intent == "specific" else GENERAL_ANSWER
+        return json.dumps({"intent": intent, "answer": answer})
+    if '"intent"' in system:
+        return json.dumps({"intent": stub_intent(question)})
+    if "SQL" in system or "Schema" in question:
+        return SQL_ANSWER
+    return GENERAL_ANSWER
+
+
+def completion_tokens_for(body: dict, content: str, settings: StubSettings):
+    """
+    Split the answer into token-like pieces, padded to the configured length, and
+    end it like llama-server: at the first stop string (not returned) or at
+    max_tokens. Returns (pieces, finish_reason).
+    """
+    pieces = [word + " " for word in content.split()]
+    if '"intent"' not in content:
+        pieces += ["lorem "] * max(0, settings.completion_tokens - len(pieces))
+    text = "".join(pieces)
+    stops = body.get("stop") or []
+    if isinstance(stops, str):
+        stops = [stops]
+    cuts = [text.find(stop) for stop in stops if stop and stop in text]
+    if cuts:
+        text = text[: min(cuts)]
+        pieces = [word + " " for word in text.split()]
+        if text and not text[-1].isspace():
+            # The stop string may follow a word directly, e.g. the ";" of a query
+            pieces[-1] = pieces[-1][:-1]
+    max_tokens = body.get("max_tokens")
+    if max_tokens and len(pieces) > max_tokens:
+        return pieces[:max_tokens], "length"
+    return pieces, "stop"
+
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI(title="Stub llama-server")
+    slots = asyncio.Semaphore(settings.slots)
+
+    def timings(prompt_n, prompt_ms, predicted_n, predicted_ms):
+        return {
+            "prompt_n": prompt_n,
+            "prompt_ms": prompt_ms,
+            "predicted_n": predicted_n,
+            "predicted_ms": predicted_ms,
+            "cache_n": 0,
+        }
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if settings.random.random() < settings.error_rate:
+            return JSONResponse(status_code=500, content={"error": "injected failure"})
+
+        content = answer_for(body)
+        tokens, finish_reason = completion_tokens_for(body, content, settings)
+        prompt_n = sum(len(m["content"]) for m in body.get("messages", [])) // 4
+        token_delay = 1 / settings.tokens_per_second
+
+        if not body.get("stream"):
+            async with slots:
+                prompt_delay = settings.prompt_delay()
+                await asyncio.sleep(prompt_delay + len(tokens) * token_delay)
+            return {
+                "model": settings.model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_n,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_n + len(tokens),
+                },
+                "timings": timings(
+                    prompt_n, prompt_delay * 1000, len(tokens), len(tokens) * token_delay * 1000
+                ),
+            }
+
+        async def events():
+            async with slots:
+                start = time.perf_counter()
+                prompt_delay = settings.prompt_delay()
+                await asyncio.sleep(prompt_delay)
+                for token in tokens:
+                    await asyncio.sleep(token_delay)
+                    chunk = {
+                        "model": settings.model,
+                        "choices": [{"index": 0, "delta": {"content": token}}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                final = {
+                    "model": settings.model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                    "timings": timings(
+                        prompt_n,
+                        prompt_delay * 1000,
+                        len(tokens),
+                        (time.perf_counter() - start - prompt_delay) * 1000,
+                    ),
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main(host: str = "127.0.0.1", port: int = 8080, **kwargs):
+    """
+    Run the stub server. Keyword arguments are passed to StubSettings
+    (distribution, prompt_ms, prompt_sigma, tokens_per_second, completion_tokens,
+    slots, error_rate, model, seed).
+    """
+    uvicorn.run(create_app(StubSettings(**kwargs)), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,192 @@
+"""
+Prometheus metrics for the RAG service.
+
+Stage latencies are recorded with the timed() decorator, which wraps the existing
+pipeline functions without changing their signatures. Everything is exposed by the
+/metrics endpoint in the Prometheus text format. A request can also collect its own
+stage timings with capture_stages(), which the query log uses.
+"""
+
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds",
+    "Latency of each stage of the generate-sql pipeline",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+INTENTS = Counter(
+    "rag_intents_total",
+    "Classified intents by intent and classifier",
+    ["intent", "source"],
+)
+INTENT_DECODE_TOKENS = Histogram(
+    "rag_intent_decode_tokens",
+    "Completion tokens decoded by the intent call, by output constraint",
+    ["mode"],
+    buckets=(1, 2, 4, 6, 8, 12, 16, 24, 32, 50),
+)
+INTENT_PARSE_FAILURES = Counter(
+    "rag_intent_parse_failures_total",
+    "Intent completions that did not parse, by output constraint (routed for single-call)",
+    ["mode"],
+)
+SQL_DECODE_TOKENS = Histogram(
+    "rag_sql_decode_tokens",
+    "Completion tokens decoded by the SQL generation call, by mode (full or sql_only)",
+    ["mode"],
+    buckets=(8, 16, 32, 48, 64, 96, 128, 192, 256, 512),
+)
+SQL_GENERATION_LATENCY = Histogram(
+    "rag_sql_generation_duration_seconds",
+    "Latency of the SQL generation call, by mode (full or sql_only)",
+    ["mode"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 30, 60),
+)
+LLM_TOKENS = Histogram(
+    "rag_llm_tokens",
+    "Tokens per completion by stage and kind (prompt, cached part of the prompt, completion)",
+    ["stage", "kind"],
+    buckets=(4, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+LLM_PHASE_DURATION = Histogram(
+    "rag_llm_phase_duration_seconds",
+    "llama-server reported time per completion by stage and phase (prompt_eval or decode)",
+    ["stage", "phase"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ERRORS = Counter("rag_errors_total", "Failed requests by endpoint", ["endpoint"])
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests_total", "Cache lookups by cache and outcome", ["cache", "outcome"]
+)
+SHORT_CIRCUIT = Counter(
+    "rag_short_circuit_total",
+    "Retrieval short-circuit checks by outcome (hit serves the stored SQL)",
+    ["outcome"],
+)
+FALLBACKS = Counter(
+    "rag_fallbacks_total",
+    "SQL generations abandoned for the best retrieved SQL, by reason (budget or overloaded)",
+    ["reason"],
+)
+QUERY_LOG_DROPPED = Counter(
+    "rag_query_log_dropped_total", "Query log entries dropped because the buffer was full"
+)
+IN_FLIGHT = Gauge(
+    "rag_in_flight_requests", "Requests currently being processed", ["endpoint"]
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "rag_admission_queue_depth", "Requests waiting for an LLM slot"
+)
+LLM_ACTIVE = Gauge("rag_llm_active_requests", "Completions currently holding an LLM slot")
+ADMISSION_WAIT = Histogram(
+    "rag_admission_wait_seconds",
+    "Time spent waiting for an LLM slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ADMISSION_REJECTED = Counter(
+    "rag_admission_rejected_total", "Requests shed by admission control", ["reason"]
+)
+COALESCED = Counter(
+    "rag_coalesced_requests_total",
+    "Requests served by joining an identical request already in flight",
+    ["operation"],
+)
+REQUESTS_CANCELLED = Counter(
+    "rag_requests_cancelled_total",
+    "Requests whose in-flight work was cancelled, by reason",
+    ["reason"],
+)
+RETRIEVED_ITEMS = Histogram(
+    "rag_retrieved_items",
+    "Question-SQL examples kept for the prompt by adaptive-k retrieval",
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8),
+)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_context_tokens",
+    "Tokens of the compact SQL prompt (kind=context) and tokens saved over the raw schema dump (kind=saved)",
+    ["kind"],
+    buckets=(0, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+)
+
+
+# Stage durations in ms of the current request, None unless they are being captured
+request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_stages", default=None
+)
+
+
+def capture_stages() -> Dict[str, float]:
+    """
+    Start collecting the stage durations of the current request, including those
+    timed in tasks and worker threads it starts afterwards.
+    """
+    stages = {}
+    request_stages.set(stages)
+    return stages
+
+
+def timed(stage: str):
+    """
+    Decorator recording the duration of a sync or async function in STAGE_LATENCY.
+
+    A coroutine cancelled before it finishes (a speculative call that was not
+    needed, a client that went away) is not recorded.
+
+    Args:
+        stage: Value of the stage label.
+    """
+    histogram = STAGE_LATENCY.labels(stage)
+
+    def observe(elapsed: float):
+        histogram.observe(elapsed)
+        stages = request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + elapsed * 1000
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                cancelled = False
+                try:
+                    return await func(*args, **kwargs)
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+                finally:
+                    if not cancelled:
+                        observe(time.perf_counter() - start)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def render_metrics():
+    """Return the exposition payload and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
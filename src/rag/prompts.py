@@ -0,0 +1,364 @@
+"""
+Prompt builders for the llama-server completions.
+
+Retrieved context is rendered compactly: repeated schemas are sent once, ids and
+similarity scores are dropped and the examples become short question/SQL pairs,
+added in relevance order until the token budget (counted with the Llama tokenizer)
+is spent.
+
+Every request is laid out static-first: the fixed system prompt (instructions and
+few-shot examples) comes before any request specific text, so consecutive calls of
+the same stage share a token prefix. The requests set cache_prompt so llama-server
+keeps that prefix in the slot's KV cache and only evaluates the new suffix. An
+optional slot id per stage keeps each stage's prefix warm in its own slot.
+"""
+
+import json
+import threading
+
+from config import prompt_config
+from metrics import PROMPT_TOKENS, timed
+
+INTENT_SYSTEM_PROMPT = """You are an AI assistant that classifies user queries as either "specific" or "general".
+
+A "specific" query refers to something that can be answered with a factual, data-driven, or concrete response — such as those involving dates, counts, or database-style queries.
+
+A "general" query refers to open-ended, opinion-based, or abstract questions that don't rely on structured data.
+
+Return a JSON object in the format: {"intent": "specific"} or {"intent": "general"}
+
+Examples:
+Query: How many users signed up in 2023?
+{"intent": "specific"}
+
+Query: What is the capital of France?
+{"intent": "general"}
+
+Query: What makes a good concert experience?
+{"intent": "general"}
+
+Query: List all concerts held in 2022.
+{"intent": "specific"}
+
+Query: How many people were there in concert between 2024 and 2025?
+{"intent": "specific"}
+"""
+
+INTENTS = ("specific", "general")
+
+# Only {"intent":"specific"} or {"intent":"general"} can be sampled
+INTENT_GRAMMAR = 'root ::= "{\\"intent\\":\\"" ("specific" | "general") "\\"}"'
+
+INTENT_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {"intent": {"type": "string", "enum": list(INTENTS)}},
+    "required": ["intent"],
+    "additionalProperties": False,
+}
+
+SQL_SYSTEM_PROMPT = "You are a helpful chatbot. Given the following database schema and natural language question, write the SQL query that answers the question and explain the query."
+
+SQL_ONLY_SYSTEM_PROMPT = "You are a SQL generator. Given the following database schema and natural language question, reply with only the SQL query that answers the question, terminated by a semicolon. Do not explain the query."
+
+EXPLAIN_SYSTEM_PROMPT = "You are a helpful chatbot. Given a SQL query and the question it answers, explain concisely what the query does and how it answers the question."
+
+# Stop after the statement, or at the fence closing a ```sql block
+SQL_ONLY_STOP = [";", "\n```"]
+
+GENERAL_SYSTEM_PROMPT = "You are a helpful, concise, and knowledgeable assistant. Answer the user’s questions clearly and accurately."
+
+ROUTED_SYSTEM_PROMPT = """You are a helpful assistant that answers questions about a database.
+
+First decide whether the question is "specific" or "general". A "specific" question can be answered with a factual, data-driven response from the database, such as those involving dates, counts or listings. A "general" question is open-ended, opinion-based or abstract and does not rely on structured data.
+
+For a "specific" question, write the SQL query that answers it using the schema and examples provided. For a "general" question, answer it clearly and concisely and ignore the schema.
+
+Return a JSON object in the format: {"intent": "specific", "answer": "<SQL query>"} or {"intent": "general", "answer": "<answer>"}
+"""
+
+ROUTED_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": list(INTENTS)},
+        "answer": {"type": "string"},
+    },
+    "required": ["intent", "answer"],
+    "additionalProperties": False,
+}
+
+config = prompt_config()
+
+# Bump whenever prompt text or layout changes, it invalidates persisted generations
+PROMPT_VERSION = "3"
+
+
+def prompt_version(stage: str) -> str:
+    """Version string of the prompt a stage is generated with, settings included."""
+    if stage == "sql" and config.sql_only:
+        stage = "sql_only"
+    if stage in ("sql", "sql_only", "routed"):
+        return f"{PROMPT_VERSION}:{stage}:{config.compact_context}:{config.context_token_budget}"
+    return f"{PROMPT_VERSION}:{stage}"
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    Load the Llama tokenizer once. Returns None when it is not available locally,
+    in which case token counts fall back to a 4 characters per token estimate.
+    """
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            try:
+                from transformers import AutoTokenizer
+
+                _tokenizer = AutoTokenizer.from_pretrained(config.tokenizer_path)
+            except Exception as e:
+                print(f"Could not load tokenizer from {config.tokenizer_path}: {str(e)}")
+                _tokenizer = False
+    return _tokenizer or None
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return (len(text) + 3) // 4
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def build_context(items: list, token_budget: int = None) -> str:
+    """
+    Render retrieved question-SQL items as a compact, token-budgeted context.
+
+    Args:
+        items: Items returned by retrieve_relevant_question_sql, most relevant first.
+        token_budget: Maximum number of context tokens, defaults to the config value.
+
+    Returns:
+        The context text, empty when nothing was retrieved.
+    """
+    token_budget = token_budget or config.context_token_budget
+    schemas, examples = [], []
+    used = 0
+    for item in items or []:
+        schema = item.get("schema", "").strip()
+        example = f"Q: {item.get('question', '').strip()}\nSQL: {item.get('sql', '').strip()}"
+        if example in examples:
+            continue
+        cost = count_tokens(example)
+        new_schema = schema and schema not in schemas
+        if new_schema:
+            cost += count_tokens(schema)
+        if used + cost > token_budget:
+            continue
+        if new_schema:
+            schemas.append(schema)
+        examples.append(example)
+        used += cost
+
+    if not examples and items:
+        # Nothing fits, keep the best example's schema cut down to the budget
+        schema = items[0].get("schema", "").strip()
+        tokenizer = get_tokenizer()
+        if tokenizer is None:
+            schemas = [schema[: token_budget * 4]]
+        else:
+            ids = tokenizer.encode(schema, add_special_tokens=False)[:token_budget]
+            schemas = [tokenizer.decode(ids)]
+
+    sections = []
+    if schemas:
+        sections.append("### Schema:\n" + "\n\n".join(schemas))
+    if examples:
+        sections.append("### Examples:\n" + "\n\n".join(examples))
+    return "\n\n".join(sections)
+
+
+def cache_hints(stage: str) -> dict:
+    """
+    Return the llama-server prompt cache parameters for a stage.
+
+    Args:
+        stage: One of "intent", "sql", "general", "routed" or "explain".
+    """
+    hints = {}
+    if config.cache_prompt:
+        hints["cache_prompt"] = True
+    slot = getattr(config, f"{stage}_slot")
+    if slot >= 0:
+        hints["id_slot"] = slot
+    return hints
+
+
+def intent_constraint() -> dict:
+    """
+    Return the llama-server parameters constraining the intent output.
+
+    With a grammar or JSON schema the answer is a handful of tokens, so the limit is
+    tight and generation stops at the closing brace.
+    """
+    if config.intent_constraint == "grammar":
+        constraint = {"grammar": INTENT_GRAMMAR}
+    elif config.intent_constraint == "json_schema":
+        constraint = {"json_schema": INTENT_JSON_SCHEMA}
+    else:
+        return {"temperature": 0.2, "max_tokens": 50}
+    return {
+        **constraint,
+        "temperature": 0.0,
+        "max_tokens": config.intent_max_tokens,
+        "stop": ["}"],
+    }
+
+
+@timed("prompt_build")
+def intent_request(query: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+            {"role": "user", "content": query},
+        ],
+        **intent_constraint(),
+        **cache_hints("intent"),
+    }
+
+
+def parse_intent(content: str):
+    """
+    Parse the intent from a completion, None when it is not a valid intent object.
+    The stop sequence strips the closing brace, so it is restored before parsing.
+    """
+    content = (content or "").strip()
+    if content.startswith("{") and not content.endswith("}"):
+        content += "}"
+    try:
+        intent = json.loads(content)["intent"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return intent if intent in INTENTS else None
+
+
+def _question_content(query: str, schema) -> str:
+    if config.compact_context:
+        context = build_context(schema)
+        content = f"{context}\n\n### Question:\n{query}"
+        if config.report_token_savings:
+            compact_tokens = count_tokens(content)
+            saved = count_tokens(f"Schema: {schema} -- -- {query}") - compact_tokens
+            PROMPT_TOKENS.labels("context").observe(compact_tokens)
+            PROMPT_TOKENS.labels("saved").observe(max(saved, 0))
+        return content
+    return f"Schema: {schema} -- -- {query}"
+
+
+def sql_mode() -> str:
+    """Return "sql_only" when generating the bare query, "full" with an explanation."""
+    return "sql_only" if config.sql_only else "full"
+
+
+@timed("prompt_build")
+def sql_query_request(query: str, schema) -> dict:
+    content = _question_content(query, schema)
+    if config.sql_only:
+        system_prompt = SQL_ONLY_SYSTEM_PROMPT
+        limits = {"max_tokens": config.sql_only_max_tokens, "stop": SQL_ONLY_STOP}
+    else:
+        system_prompt = SQL_SYSTEM_PROMPT
+        limits = {"max_tokens": 256}
+
+    return {
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            # Retrieved context before the question, the question is the most variable part
+            {"role": "user", "content": content},
+        ],
+        "temperature": 0.2,
+        **limits,
+        **cache_hints("sql"),
+    }
+
+
+def clean_sql(content: str, finish_reason: str = None) -> str:
+    """
+    Tidy a SQL-only completion: drop an opening code fence and restore the ";"
+    removed by the stop sequence. A completion cut off by max_tokens is left open.
+    """
+    sql = (content or "").strip()
+    if sql.startswith("```"):
+        sql = sql.split("\n", 1)[1] if "\n" in sql else ""
+    sql = sql.strip()
+    if sql and finish_reason == "stop" and not sql.endswith(";"):
+        sql += ";"
+    return sql
+
+
+@timed("prompt_build")
+def explain_request(sql: str, question: str = None) -> dict:
+    content = f"### SQL:\n{sql.strip()}"
+    if question:
+        content = f"{content}\n\n### Question:\n{question}"
+    return {
+        "messages": [
+            {"role": "system", "content": EXPLAIN_SYSTEM_PROMPT},
+            {"role": "user", "content": content},
+        ],
+        "temperature": 0.2,
+        "max_tokens": config.explain_max_tokens,
+        **cache_hints("explain"),
+    }
+
+
+@timed("prompt_build")
+def routed_request(query: str, schema) -> dict:
+    """
+    Request classifying and answering the question in one completion.
+
+    The retrieved context is always included, the model ignores it for general
+    questions. The answer comes back in an {"intent": ..., "answer": ...} envelope,
+    enforced with a JSON schema unless intent_constraint is "none".
+    """
+    request = {
+        "messages": [
+            {"role": "system", "content": ROUTED_SYSTEM_PROMPT},
+            {"role": "user", "content": _question_content(query, schema)},
+        ],
+        "temperature": 0.2,
+        "max_tokens": 256,
+        **cache_hints("routed"),
+    }
+    if config.intent_constraint != "none":
+        request["json_schema"] = ROUTED_JSON_SCHEMA
+    return request
+
+
+def parse_routed(content: str):
+    """
+    Parse a routed completion into (intent, answer), None when the envelope is invalid.
+    """
+    content = (content or "").strip()
+    if content.startswith("```"):
+        content = content.strip("`").removeprefix("json").strip()
+    try:
+        envelope = json.loads(content)
+        intent, answer = envelope["intent"], envelope["answer"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if intent not in INTENTS or not isinstance(answer, str):
+        return None
+    return intent, answer
+
+
+@timed("prompt_build")
+def other_query_request(query: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": GENERAL_SYSTEM_PROMPT},
+            {"role": "user", "content": query},
+        ],
+        "temperature": 0.2,
+        "max_tokens": 256,
+        **cache_hints("general"),
+    }
@@ -0,0 +1,159 @@
+"""
+Append-only JSONL log of /generate-sql requests.
+
+Each request fills in an entry (question, intent, cache outcome, stage timings,
+status) that travels in a context variable, so pipeline code annotates it without
+new arguments. Finished entries are only appended to an in-memory buffer on the
+request path; a background task writes the buffer out once per flush interval in a
+worker thread. When the file grows past max_bytes it is rotated to path.1, path.2,
+and so on. Rotation is not safe across processes, so every worker writes its own
+file ("{pid}" in the path). If the buffer fills up between flushes, new entries are dropped rather
+than slowing requests down.
+
+The log is the input of loadtest/replay.py.
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from metrics import QUERY_LOG_DROPPED, capture_stages
+
+request_entry: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "request_entry", default=None
+)
+
+
+def start_entry(**fields: Any) -> Dict[str, Any]:
+    """Start the current request's log entry and the capture of its stage timings."""
+    entry = {"ts": time.time(), "intent": None, "cache": "miss", **fields}
+    entry["stages"] = capture_stages()
+    request_entry.set(entry)
+    return entry
+
+
+def annotate(**fields: Any):
+    """Set fields of the current request's log entry, a no-op when nothing is logged."""
+    entry = request_entry.get()
+    if entry is not None:
+        entry.update(fields)
+
+
+def merge_entry(shared: Optional[Dict[str, Any]]):
+    """
+    Copy the intent, cache outcome and stage timings of work shared with other
+    requests into the current request's log entry.
+    """
+    entry = request_entry.get()
+    if entry is None or shared is None:
+        return
+    entry["intent"] = shared["intent"]
+    if entry["cache"] == "miss":
+        entry["cache"] = shared["cache"]
+    entry["stages"].update(shared["stages"])
+
+
+class QueryLog:
+    """
+    Buffered, size rotated JSONL writer flushed from a background task.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 2**20,
+        backups: int = 5,
+        flush_interval: float = 1.0,
+        max_buffer: int = 10000,
+    ):
+        """
+        Args:
+            path: Log file path, "{pid}" is replaced by the process id.
+            max_bytes: Size at which the file is rotated.
+            backups: Number of rotated files kept.
+            flush_interval: Seconds between flushes.
+            max_buffer: Entries held between flushes before new ones are dropped.
+        """
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, entry: Dict[str, Any]):
+        """Queue an entry for the next flush, never blocks."""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            QUERY_LOG_DROPPED.inc()
+            return
+        self._buffer.append(entry)
+
+    def start(self):
+        """Start the periodic flush task, call from the running event loop."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except OSError as e:
+                print(f"Could not write query log {self.path}: {str(e)}")
+
+    async def flush(self):
+        """Write all buffered entries."""
+        async with self._lock:
+            if not self._buffer:
+                return
+            entries, self._buffer = self._buffer, []
+            text = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+            await asyncio.to_thread(self._write, text)
+            self.written += len(entries)
+
+    def _write(self, text: str):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(text) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    async def aclose(self):
+        """Stop the flush task and write what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
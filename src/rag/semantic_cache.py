@@ -0,0 +1,241 @@
+"""
+Semantic cache of generated answers keyed on normalized question embeddings.
+
+A lookup returns the stored response of the most similar cached question when its
+cosine similarity clears the threshold. Entries are evicted least recently used
+first, when they outlive the TTL, or when the cache exceeds its memory bound.
+
+Embeddings live in one preallocated matrix whose rows are reused as entries come and
+go, so a lookup is a single matrix-vector product and the TTL check a vectorized
+comparison, instead of restacking every entry per request.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    LRU + TTL cache with cosine similarity lookups.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600.0,
+        max_bytes: int = 64 * 2**20,
+        persist_path: Optional[str] = None,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit.
+            max_entries: Maximum number of cached questions.
+            ttl_seconds: Lifetime of an entry in seconds, 0 disables expiry.
+            max_bytes: Approximate memory bound for embeddings and responses.
+            persist_path: Optional JSON file used by load() and save().
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Row storage: embeddings, creation times and liveness, indexed by entry["row"]
+        self._matrix: Optional[np.ndarray] = None
+        self._created = np.empty(0, dtype=np.float64)
+        self._active = np.zeros(0, dtype=bool)
+        self._row_keys: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    @staticmethod
+    def _entry_size(entry: Dict[str, Any]) -> int:
+        return entry["embedding"].nbytes + len(json.dumps(entry["response"]))
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return bool(self.ttl_seconds) and now - entry["created_at"] > self.ttl_seconds
+
+    def _allocate_row(self, dim: int) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._row_keys)
+        if self._matrix is None:
+            capacity = max(16, min(self.max_entries + 1, 256))
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            self._created = np.zeros(capacity, dtype=np.float64)
+            self._active = np.zeros(capacity, dtype=bool)
+        elif row >= len(self._matrix):
+            capacity = 2 * len(self._matrix)
+            self._matrix = np.resize(self._matrix, (capacity, dim))
+            self._created = np.resize(self._created, capacity)
+            self._active = np.concatenate(
+                [self._active, np.zeros(capacity - len(self._active), dtype=bool)]
+            )
+        self._row_keys.append(None)
+        return row
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        if key in self._entries:
+            self._remove(key)
+        row = self._allocate_row(len(entry["embedding"]))
+        # The matrix row is the only copy of the embedding
+        self._matrix[row] = entry.pop("embedding")
+        self._created[row] = entry["created_at"]
+        self._active[row] = True
+        self._row_keys[row] = key
+        entry["row"] = row
+        self._entries[key] = entry
+        self._bytes += entry["size"]
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        row = entry["row"]
+        self._active[row] = False
+        self._row_keys[row] = None
+        self._free_rows.append(row)
+
+    def _expire(self, now: float):
+        if not self.ttl_seconds or not self._entries:
+            return
+        rows = len(self._row_keys)
+        expired = np.flatnonzero(
+            self._active[:rows] & (now - self._created[:rows] > self.ttl_seconds)
+        )
+        for row in expired:
+            self._remove(self._row_keys[row])
+
+    def _evict(self, now: float):
+        self._expire(now)
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def get(self, embedding: Sequence[float]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached response of the closest question above the threshold.
+
+        Args:
+            embedding: Normalized question embedding.
+
+        Returns:
+            The cached response dict, or None on a miss.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if self._entries:
+                rows = len(self._row_keys)
+                scores = self._matrix[:rows] @ query
+                scores[~self._active[:rows]] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._row_keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return {
+                        **self._entries[key]["response"],
+                        "similarity": float(scores[best]),
+                    }
+            self.misses += 1
+        return None
+
+    def put(self, question: str, embedding: Sequence[float], response: Dict[str, Any]):
+        """
+        Store a generated response for a question.
+
+        Args:
+            question: The question the response was generated for.
+            embedding: Normalized question embedding.
+            response: JSON serializable response to return on later hits.
+        """
+        key = self.normalize_question(question)
+        entry = {
+            "embedding": np.asarray(embedding, dtype=np.float32),
+            "response": response,
+            "created_at": time.time(),
+        }
+        entry["size"] = self._entry_size(entry)
+        with self._lock:
+            self._store(key, entry)
+            self._evict(entry["created_at"])
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            self._expire(time.time())
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def save(self, path: Optional[str] = None):
+        """Write the live entries to a JSON file."""
+        path = path or self.persist_path
+        if not path:
+            return
+        with self._lock:
+            self._evict(time.time())
+            data = [
+                {
+                    "key": key,
+                    "embedding": self._matrix[entry["row"]].tolist(),
+                    "response": entry["response"],
+                    "created_at": entry["created_at"],
+                }
+                for key, entry in self._entries.items()
+            ]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """
+        Load entries written by save(), skipping expired ones.
+
+        Returns:
+            Number of entries loaded.
+        """
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            data = json.load(f)
+
+        now = time.time()
+        with self._lock:
+            for item in data:
+                entry = {
+                    "embedding": np.asarray(item["embedding"], dtype=np.float32),
+                    "response": item["response"],
+                    "created_at": item["created_at"],
+                }
+                if self._expired(entry, now):
+                    continue
+                entry["size"] = self._entry_size(entry)
+                self._store(item["key"], entry)
+            self._evict(now)
+            return len(self._entries)
@@ -0,0 +1,72 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+The first caller for a key starts the work as its own task and later callers with
+the same key await that task instead of repeating it. The task is only cancelled
+when every caller waiting on it has gone away, so one client disconnecting does
+not fail the others.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+
+from metrics import COALESCED
+
+
+def retrieve_exception(task: asyncio.Task):
+    """
+    Done callback marking a task's exception as retrieved, for tasks that may fail
+    after everyone awaiting them has gone.
+    """
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key onto one in-flight task.
+    """
+
+    def __init__(self, name: str = "generate_sql"):
+        self.name = name
+        self._inflight: Dict[str, List[Any]] = {}  # key -> [task, waiters]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key, or join the identical call already in flight.
+
+        Args:
+            key: Coalescing key, callers with equal keys share one result.
+            fn: Zero argument coroutine function doing the work.
+
+        Returns:
+            The result of the shared call.
+        """
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(key, entry))
+            task.add_done_callback(retrieve_exception)
+        else:
+            COALESCED.labels(self.name).inc()
+
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+            raise
+
+    def _forget(self, key: str, entry: List[Any]):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def joins(self, key: str) -> bool:
+        """Whether a call for key now would join one already in flight."""
+        return key in self._inflight
+
+    def inflight(self) -> int:
+        return len(self._inflight)
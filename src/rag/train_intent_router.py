@@ -0,0 +1,77 @@
+"""
+Train and evaluate the embedding based intent router.
+
+Reads a CSV with "question" and "intent" columns, embeds the questions with
+UAE-Large-V1, fits a CentroidIntentRouter on a training split and reports accuracy
+and the share of held-out queries that would skip the LLM at several thresholds.
+
+    python src/rag/train_intent_router.py --csv_path data/rag/intent_labels.csv
+"""
+
+import json
+from pathlib import Path
+
+import fire
+import numpy as np
+import pandas as pd
+
+from config import pipeline_config
+from intent_router import CentroidIntentRouter
+from vectorstore.chroma import SentenceTransformerEmbeddingFunction
+
+
+def evaluate(router, embeddings, labels, thresholds):
+    """
+    Compute overall accuracy and, per threshold, the local routing coverage and accuracy.
+    """
+    predictions = [router.predict(embedding) for embedding in embeddings]
+    correct = np.array([intent == label for (intent, _), label in zip(predictions, labels)])
+    margins = np.array([margin for _, margin in predictions])
+
+    report = {"accuracy": float(correct.mean()), "thresholds": {}}
+    for threshold in thresholds:
+        confident = margins >= threshold
+        report["thresholds"][str(threshold)] = {
+            "skip_rate": float(confident.mean()),
+            "local_accuracy": float(correct[confident].mean()) if confident.any() else None,
+        }
+    return report
+
+
+def main(
+    csv_path: str = str(Path(__file__).parent.parent.parent / "data" / "rag" / "intent_labels.csv"),
+    output_path: str = pipeline_config.intent_router_path,
+    model_name: str = "WhereIsAI/UAE-Large-V1",
+    threshold: float = pipeline_config.intent_router_threshold,
+    test_size: float = 0.25,
+    seed: int = 42,
+):
+    df = pd.read_csv(csv_path)
+    df = df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    n_test = max(1, int(len(df) * test_size))
+    test_df, train_df = df.iloc[:n_test], df.iloc[n_test:]
+
+    embedding_function = SentenceTransformerEmbeddingFunction(model_name)
+    train_embeddings = embedding_function(train_df["question"].tolist())
+    test_embeddings = embedding_function(test_df["question"].tolist())
+
+    router = CentroidIntentRouter(threshold=threshold).fit(
+        train_embeddings, train_df["intent"].tolist()
+    )
+    report = evaluate(
+        router,
+        test_embeddings,
+        test_df["intent"].tolist(),
+        thresholds=sorted({0.0, 0.02, 0.05, 0.1, threshold}),
+    )
+    print(f"Train: {len(train_df)} examples, test: {len(test_df)} examples")
+    print(json.dumps(report, indent=2))
+
+    # Refit on everything before saving, the held-out split was only for reporting
+    router.fit(embedding_function(df["question"].tolist()), df["intent"].tolist())
+    router.save(output_path)
+    print(f"Saved intent router to {output_path}")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
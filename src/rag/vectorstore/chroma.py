@@ -12,6 +12,7 @@ import json
 from typing import List, Dict, Any, Union
 from sentence_transformers import SentenceTransformer
 from .ivectorstore import IVectorstore
+from .embedding_batcher import EmbeddingBatcher
 from chromadb.utils.embedding_functions import EmbeddingFunction
 
 
@@ -20,14 +21,28 @@ class SentenceTransformerEmbeddingFunction(EmbeddingFunction):
     Sentence Transformer embedding function that follows ChromaDB's expected interface.
     """
 
-    def __init__(self, model_name: str):
+    def __init__(
+        self, model_name: str, batch_window_ms: float = 0, max_batch_size: int = 16
+    ):
         """
         Initialize with a sentence transformer model.
 
         Args:
             model_name: The name of the sentence transformer model.
+            batch_window_ms: When > 0, concurrent calls arriving within this window
+                are encoded together in one batch.
+            max_batch_size: Maximum number of texts per batched encode.
         """
         self.model = SentenceTransformer(model_name)
+        self.batcher = None
+        if batch_window_ms > 0:
+            self.batcher = EmbeddingBatcher(
+                self._encode, max_batch_size=max_batch_size, window_ms=batch_window_ms
+            )
+
+    def _encode(self, input: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(input, normalize_embeddings=True)
+        return embeddings.tolist()
 
     def __call__(self, input: List[str]) -> List[List[float]]:
         """
@@ -39,8 +54,9 @@ class SentenceTransformerEmbeddingFunction(EmbeddingFunction):
         Returns:
             List of embedding vectors.
         """
-        embeddings = self.model.encode(input, normalize_embeddings=True)
-        return embeddings.tolist()
+        if self.batcher is not None:
+            return self.batcher.encode(input)
+        return self._encode(input)
 
 
 class ChromaVectorStore(IVectorstore):
@@ -51,19 +67,28 @@ class ChromaVectorStore(IVectorstore):
     and retrieving SQL-related documents using ChromaDB with UAE-Large-V1 embeddings.
     """
 
-    def __init__(self, persist_directory: str = "./vectorstore"):
+    def __init__(
+        self,
+        persist_directory: str = "./vectorstore",
+        batch_window_ms: float = 0,
+        max_batch_size: int = 16,
+    ):
         """
         Initialize the ChromaDB vector store.
 
         Args:
             persist_directory: Directory where ChromaDB will persist the data.
+            batch_window_ms: Micro-batching window for query embeddings, 0 disables it.
+            max_batch_size: Maximum number of texts per batched encode.
         """
         self.persist_directory = persist_directory
         self.client = chromadb.PersistentClient(path=persist_directory)
 
         # Create embedding function with proper interface
         self.embedding_function = SentenceTransformerEmbeddingFunction(
-            "WhereIsAI/UAE-Large-V1"
+            "WhereIsAI/UAE-Large-V1",
+            batch_window_ms=batch_window_ms,
+            max_batch_size=max_batch_size,
         )
 
         # Create only the question_sql collection
@@ -82,6 +107,18 @@ class ChromaVectorStore(IVectorstore):
         """
         return str(uuid.uuid4())
 
+    def embed_queries(self, questions: List[str]) -> List[List[float]]:
+        """
+        Embed questions with the collection's embedding function.
+
+        Args:
+            questions: List of natural language questions.
+
+        Returns:
+            List of normalized embedding vectors.
+        """
+        return self.embedding_function(questions)
+
     def retrieve_relevant_question_sql(
         self, question: str, k: int = 5, **kwargs
     ) -> list:
@@ -91,41 +128,95 @@ class ChromaVectorStore(IVectorstore):
         Args:
             question: The natural language question to find relevant items for.
             k: Number of results to return (default: 5).
-            **kwargs: Additional arguments including threshold for filtering.
+            **kwargs: Additional arguments including threshold for filtering and
+                query_embedding to reuse an embedding computed by the caller.
 
         Returns:
             List of relevant question-SQL documents.
         """
         threshold = kwargs.get("threshold", 0.3)
+        query_embedding = kwargs.get("query_embedding")
 
-        results = self.question_sql_collection.query(
-            query_texts=[question], n_results=k
-        )
+        if query_embedding is not None:
+            results = self.question_sql_collection.query(
+                query_embeddings=[query_embedding], n_results=k
+            )
+        else:
+            results = self.question_sql_collection.query(
+                query_texts=[question], n_results=k
+            )
+
+        return self._relevant_items(results, 0, threshold)
+
+    def _relevant_items(self, results: dict, row: int, threshold: float) -> list:
+        """
+        Convert one row of a Chroma query result into question-SQL items.
+
+        Args:
+            results: Result of question_sql_collection.query.
+            row: Index of the query within the result.
+            threshold: Minimum similarity to keep an item.
 
+        Returns:
+            List of relevant question-SQL documents.
+        """
         relevant_items = []
-        for i, doc_id in enumerate(results["ids"][0]):
-            metadata = results["metadatas"][0][i]
+        for i, doc_id in enumerate(results["ids"][row]):
+            metadata = results["metadatas"][row][i]
             score = (
-                results.get("distances", [[]])[0][i] if results.get("distances") else 0
+                results.get("distances", [[]])[row][i] if results.get("distances") else None
             )
 
             # Convert distance to similarity score (1 - distance)
-            similarity = 1 - score if score else 0
+            similarity = 1 - score if score is not None else 0
             if similarity >= threshold:
-                item = {
-                    "id": doc_id,
-                    "schema": metadata.get("schema", ""),
-                    "question": metadata.get("question", ""),
-                    "sql": metadata.get("sql", ""),
-                    "similarity": similarity,
-                }
-            relevant_items.append(item)
+                relevant_items.append(
+                    {
+                        "id": doc_id,
+                        "schema": metadata.get("schema", ""),
+                        "question": metadata.get("question", ""),
+                        "sql": metadata.get("sql", ""),
+                        "similarity": similarity,
+                    }
+                )
             # print(f"Query: {question}")
-            # print("Distances:", results.get("distances", [[]])[0])
-            # print("Retrieved Metadata Sample:", results["metadatas"][0][0])
+            # print("Distances:", results.get("distances", [[]])[row])
+            # print("Retrieved Metadata Sample:", results["metadatas"][row][0])
 
         return relevant_items
 
+    def retrieve_relevant_question_sql_batch(
+        self, questions: List[str], k: int = 5, **kwargs
+    ) -> List[list]:
+        """
+        Retrieve relevant question-SQL pairs for several questions in one query.
+
+        Args:
+            questions: The natural language questions.
+            k: Number of results to return per question (default: 5).
+            **kwargs: Additional arguments including threshold for filtering and
+                query_embeddings to reuse embeddings computed by the caller.
+
+        Returns:
+            One list of relevant question-SQL documents per question.
+        """
+        threshold = kwargs.get("threshold", 0.3)
+        query_embeddings = kwargs.get("query_embeddings")
+
+        if query_embeddings is not None:
+            results = self.question_sql_collection.query(
+                query_embeddings=list(query_embeddings), n_results=k
+            )
+        else:
+            results = self.question_sql_collection.query(
+                query_texts=list(questions), n_results=k
+            )
+
+        return [
+            self._relevant_items(results, row, threshold)
+            for row in range(len(questions))
+        ]
+
     def index_question_sql(
         self, question: str, sql: str, schema: str = "", **kwargs
     ) -> str:
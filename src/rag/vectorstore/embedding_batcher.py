@@ -0,0 +1,102 @@
+"""
+Micro-batching of concurrent embedding requests.
+
+Callers block on encode() while a background thread gathers requests for up to
+window_ms (or until max_batch_size texts are queued) and runs a single encode on
+the whole batch, handing each caller back its own slice of the result.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+
+class EmbeddingBatcher:
+    """
+    Thread based batcher around a batch encode function.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = 16,
+        window_ms: float = 5.0,
+    ):
+        """
+        Initialize the batcher and start its worker thread.
+
+        Args:
+            encode_fn: Function embedding a list of texts in one call.
+            max_batch_size: Maximum number of texts encoded together.
+            window_ms: How long the first request of a batch waits for company.
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts as part of the next batch.
+
+        Args:
+            texts: Texts to embed.
+
+        Returns:
+            One embedding per text, in order.
+        """
+        future: Future = Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                embeddings = self.encode_fn(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.texts += len(texts)
+
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(embeddings[offset : offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def stats(self) -> Dict[str, float]:
+        """Return the number of encode calls made and the mean batch size."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            }